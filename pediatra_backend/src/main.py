@@ -4,14 +4,25 @@ import sys
 sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 
 from flask import Flask, send_from_directory
-from flask_jwt_extended import JWTManager
+from flask_jwt_extended import JWTManager, jwt_required, get_jwt_identity
 from flask_cors import CORS
-from src.models.user import db
+from datetime import timedelta
+from src.models.user import db, User
+from src.models.busca import criar_indices_busca
+from src.models.migracoes import garantir_autoincremento, adicionar_colunas
 from src.routes.user import user_bp
 from src.routes.auth import auth_bp
 from src.routes.agendamento import agendamento_bp
 from src.routes.mensagem import mensagem_bp
 from src.routes.documento import documento_bp
+from src.routes.importacao import importacao_bp
+from src.routes.exportacao import exportacao_bp
+from src.routes.estatisticas import estatisticas_bp
+from src.services.lembretes import AgendadorLembretes, criar_notificador
+from src.services.arquivamento import arquivar
+from src.services.limite import limitador, BaldeRedis
+from src.services.armazenamento import escolher_codec
+import click
 
 app = Flask(__name__, static_folder=os.path.join(os.path.dirname(__file__), 'static'))
 app.config['SECRET_KEY'] = 'asdf#FGSgvasgf$5$WGT'
@@ -29,6 +40,9 @@ app.register_blueprint(auth_bp, url_prefix='/api/auth')
 app.register_blueprint(agendamento_bp, url_prefix='/api')
 app.register_blueprint(mensagem_bp, url_prefix='/api')
 app.register_blueprint(documento_bp, url_prefix='/api')
+app.register_blueprint(importacao_bp, url_prefix='/api')
+app.register_blueprint(exportacao_bp, url_prefix='/api')
+app.register_blueprint(estatisticas_bp, url_prefix='/api')
 
 # Configurar banco de dados
 app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(os.path.dirname(__file__), 'database', 'app.db')}"
@@ -38,6 +52,9 @@ db.init_app(app)
 # Criar tabelas e dados iniciais
 with app.app_context():
     db.create_all()
+    garantir_autoincremento()
+    adicionar_colunas()
+    criar_indices_busca()
     
     # Criar usuário médica padrão se não existir
     from src.models.user import User
@@ -55,6 +72,60 @@ with app.app_context():
         db.session.commit()
         print("Usuário médica criado: username=dra_pediatra, senha=senha123")
 
+# Configurar limite de requisições (memória por processo, ou Redis compartilhado entre workers)
+app.config['LIMITE_BACKEND'] = os.environ.get('LIMITE_BACKEND', 'memoria')  # memoria, redis
+app.config['LIMITE_REDIS_URL'] = os.environ.get('LIMITE_REDIS_URL', 'redis://localhost:6379/0')
+if app.config['LIMITE_BACKEND'] == 'redis':
+    limitador.configurar(BaldeRedis(app.config['LIMITE_REDIS_URL']))
+
+# Configurar lembretes de consulta
+app.config['LEMBRETES_NOTIFICADOR'] = os.environ.get('LEMBRETES_NOTIFICADOR', 'log')  # log, smtp, webhook
+app.config['LEMBRETES_WEBHOOK_URL'] = os.environ.get('LEMBRETES_WEBHOOK_URL')
+app.config['LEMBRETES_ANTECEDENCIA_HORAS'] = int(os.environ.get('LEMBRETES_ANTECEDENCIA_HORAS', 24))
+app.config['LEMBRETES_INTERVALO_SEGUNDOS'] = int(os.environ.get('LEMBRETES_INTERVALO_SEGUNDOS', 60))
+app.config['SMTP_HOST'] = os.environ.get('SMTP_HOST', 'localhost')
+app.config['SMTP_PORTA'] = os.environ.get('SMTP_PORTA', 25)
+app.config['SMTP_REMETENTE'] = os.environ.get('SMTP_REMETENTE', 'nao-responda@pediatra.com.br')
+app.config['SMTP_USUARIO'] = os.environ.get('SMTP_USUARIO')
+app.config['SMTP_SENHA'] = os.environ.get('SMTP_SENHA')
+app.config['SMTP_TLS'] = os.environ.get('SMTP_TLS') == '1'
+
+def criar_agendador_lembretes():
+    return AgendadorLembretes(
+        app,
+        criar_notificador(app.config),
+        intervalo=app.config['LEMBRETES_INTERVALO_SEGUNDOS'],
+        antecedencia=timedelta(hours=app.config['LEMBRETES_ANTECEDENCIA_HORAS'])
+    )
+
+# Agendador embutido (use apenas com um único processo web). Com o auto-reloader do modo
+# debug o módulo é importado no processo monitor e no processo servidor: inicia só no servidor
+reloader_ativo = __name__ == '__main__' or app.debug
+if os.environ.get('LEMBRETES_EM_PROCESSO') == '1' and (
+    not reloader_ativo or os.environ.get('WERKZEUG_RUN_MAIN') == 'true'
+):
+    criar_agendador_lembretes().iniciar()
+
+@app.cli.command('lembretes')
+def lembretes_worker():
+    """Executa o agendador de lembretes como processo separado."""
+    criar_agendador_lembretes().executar()
+
+# Compressão dos documentos enviados: desligado, gzip, zstd ou auto (zstd se instalado, senão gzip)
+app.config['DOCUMENTOS_COMPRESSAO'] = os.environ.get('DOCUMENTOS_COMPRESSAO', 'desligado')
+escolher_codec(app.config['DOCUMENTOS_COMPRESSAO'])
+
+# Configurar arquivamento de agendamentos e mensagens antigos
+app.config['ARQUIVO_IDADE_DIAS'] = int(os.environ.get('ARQUIVO_IDADE_DIAS', 365))
+
+@app.cli.command('arquivar')
+@click.option('--idade-dias', type=int, default=None, help='Idade mínima em dias (padrão: ARQUIVO_IDADE_DIAS)')
+@click.option('--lote', type=int, default=1000, help='Linhas movidas por transação')
+def arquivar_comando(idade_dias, lote):
+    """Move agendamentos finalizados e mensagens antigos para as tabelas de arquivo."""
+    total = arquivar(idade_dias or app.config['ARQUIVO_IDADE_DIAS'], tamanho_lote=lote)
+    click.echo(f"{total['agendamentos']} agendamentos e {total['mensagens']} mensagens arquivados")
+
 @app.route('/', defaults={'path': ''})
 @app.route('/<path:path>')
 def serve(path):
@@ -75,5 +146,18 @@ def serve(path):
 def health_check():
     return {'status': 'OK', 'message': 'API funcionando corretamente'}, 200
 
+@app.route('/api/metricas', methods=['GET'])
+@jwt_required()
+def metricas():
+    user = User.query.get(get_jwt_identity())
+    if not user:
+        return {'error': 'Usuário não encontrado'}, 404
+    
+    if user.role not in ['medica', 'admin']:
+        return {'error': 'Sem permissão para acessar métricas'}, 403
+    
+    # Contadores mantidos em memória: refletem apenas este processo, mesmo com o backend redis
+    return {'escopo': 'processo', 'pid': os.getpid(), 'limites': limitador.metricas()}, 200
+
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5000, debug=True)
@@ -0,0 +1,129 @@
+from src.models.user import db
+
+# Índice de texto completo das mensagens (FTS5 com conteúdo externo na tabela mensagem).
+# remove_diacritics faz "febre" encontrar "fébre" e vice-versa.
+DDL_MENSAGEM_FTS = [
+    """
+    CREATE VIRTUAL TABLE mensagem_fts USING fts5(
+        conteudo,
+        content='mensagem',
+        content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS mensagem_fts_ai AFTER INSERT ON mensagem BEGIN
+        INSERT INTO mensagem_fts(rowid, conteudo) VALUES (new.id, new.conteudo);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS mensagem_fts_ad AFTER DELETE ON mensagem BEGIN
+        INSERT INTO mensagem_fts(mensagem_fts, rowid, conteudo) VALUES ('delete', old.id, old.conteudo);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS mensagem_fts_au AFTER UPDATE OF conteudo ON mensagem BEGIN
+        INSERT INTO mensagem_fts(mensagem_fts, rowid, conteudo) VALUES ('delete', old.id, old.conteudo);
+        INSERT INTO mensagem_fts(rowid, conteudo) VALUES (new.id, new.conteudo);
+    END
+    """,
+]
+
+# Mesmo índice sobre as mensagens arquivadas, para a busca alcançar todo o histórico.
+# O arquivo só recebe inserções (arquivamento) e exclusões.
+DDL_MENSAGEM_ARQUIVO_FTS = [
+    """
+    CREATE VIRTUAL TABLE mensagem_arquivo_fts USING fts5(
+        conteudo,
+        content='mensagem_arquivo',
+        content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS mensagem_arquivo_fts_ai AFTER INSERT ON mensagem_arquivo BEGIN
+        INSERT INTO mensagem_arquivo_fts(rowid, conteudo) VALUES (new.id, new.conteudo);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS mensagem_arquivo_fts_ad AFTER DELETE ON mensagem_arquivo BEGIN
+        INSERT INTO mensagem_arquivo_fts(mensagem_arquivo_fts, rowid, conteudo) VALUES ('delete', old.id, old.conteudo);
+    END
+    """,
+]
+
+def somente_digitos(coluna):
+    """Expressão SQL que remove a pontuação usual de CPF e telefone."""
+    expressao = f"coalesce({coluna}, '')"
+    for caractere in ['.', '-', '(', ')', ' ', '/', '+']:
+        expressao = f"replace({expressao}, '{caractere}', '')"
+    return expressao
+
+# Índice de busca de pacientes: nome com prefixos indexados para autocompletar,
+# CPF e telefone normalizados para busca exata por dígitos.
+DDL_PACIENTE_FTS = [
+    """
+    CREATE VIRTUAL TABLE paciente_fts USING fts5(
+        nome,
+        documentos,
+        tokenize='unicode61 remove_diacritics 2',
+        prefix='2 3 4'
+    )
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS paciente_fts_ai AFTER INSERT ON user WHEN new.role = 'paciente' BEGIN
+        INSERT INTO paciente_fts(rowid, nome, documentos)
+        VALUES (new.id, new.nome_completo, {somente_digitos('new.cpf')} || ' ' || {somente_digitos('new.telefone')});
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS paciente_fts_ad AFTER DELETE ON user BEGIN
+        DELETE FROM paciente_fts WHERE rowid = old.id;
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS paciente_fts_au AFTER UPDATE OF nome_completo, cpf, telefone, role ON user BEGIN
+        DELETE FROM paciente_fts WHERE rowid = old.id;
+        INSERT INTO paciente_fts(rowid, nome, documentos)
+        SELECT new.id, new.nome_completo, {somente_digitos('new.cpf')} || ' ' || {somente_digitos('new.telefone')}
+        WHERE new.role = 'paciente';
+    END
+    """,
+]
+
+REBUILD_PACIENTE_FTS = f"""
+    INSERT INTO paciente_fts(rowid, nome, documentos)
+    SELECT id, nome_completo, {somente_digitos('cpf')} || ' ' || {somente_digitos('telefone')}
+    FROM user WHERE role = 'paciente'
+"""
+
+def tabela_existe(conexao, nome):
+    return conexao.execute(
+        db.text("SELECT 1 FROM sqlite_master WHERE name = :nome"),
+        {'nome': nome}
+    ).first() is not None
+
+def criar_indices_busca():
+    """Cria as tabelas FTS5 e seus triggers. Deve ser chamada depois de db.create_all()."""
+    if db.engine.dialect.name != 'sqlite':
+        return
+
+    with db.engine.begin() as conexao:
+        if not tabela_existe(conexao, 'mensagem_fts'):
+            conexao.execute(db.text(DDL_MENSAGEM_FTS[0]))
+            # Banco já existente: indexar as mensagens anteriores
+            conexao.execute(db.text("INSERT INTO mensagem_fts(mensagem_fts) VALUES ('rebuild')"))
+        for ddl in DDL_MENSAGEM_FTS[1:]:
+            conexao.execute(db.text(ddl))
+        
+        if not tabela_existe(conexao, 'mensagem_arquivo_fts'):
+            conexao.execute(db.text(DDL_MENSAGEM_ARQUIVO_FTS[0]))
+            conexao.execute(db.text("INSERT INTO mensagem_arquivo_fts(mensagem_arquivo_fts) VALUES ('rebuild')"))
+        for ddl in DDL_MENSAGEM_ARQUIVO_FTS[1:]:
+            conexao.execute(db.text(ddl))
+        
+        if not tabela_existe(conexao, 'paciente_fts'):
+            conexao.execute(db.text(DDL_PACIENTE_FTS[0]))
+            conexao.execute(db.text(REBUILD_PACIENTE_FTS))
+        for ddl in DDL_PACIENTE_FTS[1:]:
+            conexao.execute(db.text(ddl))
@@ -0,0 +1,120 @@
+from src.models.user import db, Agendamento, Mensagem, AgendamentoArquivo, MensagemArquivo, Documento
+from src.models.busca import tabela_existe
+
+# Tabelas que passaram a usar AUTOINCREMENT, com a tabela de arquivo que guarda seus ids antigos
+TABELAS_AUTOINCREMENTO = [
+    (Agendamento.__table__, AgendamentoArquivo.__table__),
+    (Mensagem.__table__, MensagemArquivo.__table__),
+]
+
+# Colunas acrescentadas a tabelas existentes; db.create_all() não altera tabelas já criadas
+COLUNAS_ADICIONADAS = [
+    Documento.__table__.c.codec,
+    Documento.__table__.c.tamanho_armazenado,
+    Documento.__table__.c.integridade,
+    Mensagem.__table__.c.updated_at,
+    MensagemArquivo.__table__.c.updated_at,
+]
+
+# Índices acrescentados a tabelas existentes
+INDICES_ADICIONADOS = [
+    'ix_documento_caminho_arquivo',
+    'ix_mensagem_updated_at',
+    'ix_mensagem_arquivo_updated_at',
+]
+
+# Valor inicial das colunas acrescentadas que não podem ficar nulas: (coluna, coluna de origem).
+# Também cobre linhas copiadas por reconstruir_com_autoincremento, que já cria a coluna vazia.
+PREENCHIMENTOS = [
+    (Mensagem.__table__.c.updated_at, Mensagem.__table__.c.created_at),
+    (MensagemArquivo.__table__.c.updated_at, MensagemArquivo.__table__.c.created_at),
+]
+
+def usa_autoincremento(conexao, nome):
+    sql = conexao.execute(
+        db.text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = :nome"),
+        {'nome': nome}
+    ).scalar()
+    return sql is None or 'AUTOINCREMENT' in sql.upper()
+
+def colunas_existentes(conexao, nome):
+    return {linha[1] for linha in conexao.execute(db.text(f'PRAGMA table_info({nome})'))}
+
+def reconstruir_com_autoincremento(conexao, tabela, arquivo):
+    """Recria a tabela com AUTOINCREMENT preservando linhas e índices. Retorna quantas linhas mudaram de id.
+
+    Linhas que já receberam um id existente no arquivo (o bug que a migração corrige) ganham um
+    id novo; as demais mantêm o seu.
+    """
+    antiga = f'{tabela.name}_antiga'
+    conexao.execute(db.text(f'ALTER TABLE {tabela.name} RENAME TO {antiga}'))
+    # Os índices acompanham a tabela renomeada; liberar os nomes para a nova
+    for indice in tabela.indexes:
+        conexao.execute(db.text(f'DROP INDEX IF EXISTS {indice.name}'))
+    tabela.create(conexao)
+
+    # O próximo id não pode repetir nenhum id da tabela nem do arquivo
+    maior_id = conexao.execute(db.text(
+        f'SELECT max(coalesce((SELECT max(id) FROM {antiga}), 0), coalesce((SELECT max(id) FROM {arquivo.name}), 0))'
+    )).scalar()
+    conexao.execute(db.text('DELETE FROM sqlite_sequence WHERE name = :nome'), {'nome': tabela.name})
+    conexao.execute(
+        db.text('INSERT INTO sqlite_sequence (name, seq) VALUES (:nome, :seq)'),
+        {'nome': tabela.name, 'seq': maior_id}
+    )
+
+    # Bancos mais antigos podem não ter todas as colunas do modelo: copiar só as comuns
+    existentes = colunas_existentes(conexao, antiga)
+    colunas = [coluna.name for coluna in tabela.columns if coluna.name in existentes]
+    todas = ', '.join(colunas)
+    sem_id = ', '.join(nome for nome in colunas if nome != 'id')
+    conexao.execute(db.text(
+        f'INSERT INTO {tabela.name} ({todas}) SELECT {todas} FROM {antiga} '
+        f'WHERE id NOT IN (SELECT id FROM {arquivo.name}) ORDER BY id'
+    ))
+    renumeradas = conexao.execute(db.text(
+        f'INSERT INTO {tabela.name} ({sem_id}) SELECT {sem_id} FROM {antiga} '
+        f'WHERE id IN (SELECT id FROM {arquivo.name}) ORDER BY id'
+    )).rowcount
+    conexao.execute(db.text(f'DROP TABLE {antiga}'))
+    return renumeradas
+
+def garantir_autoincremento():
+    """Migra bancos criados antes do AUTOINCREMENT. Deve ser chamada depois de db.create_all()
+    e antes de criar_indices_busca(), que recria os triggers removidos junto com a tabela antiga.
+    """
+    if db.engine.dialect.name != 'sqlite':
+        return
+
+    with db.engine.begin() as conexao:
+        for tabela, arquivo in TABELAS_AUTOINCREMENTO:
+            if usa_autoincremento(conexao, tabela.name):
+                continue
+            renumeradas = reconstruir_com_autoincremento(conexao, tabela, arquivo)
+            # Mensagens com id novo precisam ser reindexadas na busca textual
+            if renumeradas and tabela is Mensagem.__table__ and tabela_existe(conexao, 'mensagem_fts'):
+                conexao.execute(db.text("INSERT INTO mensagem_fts(mensagem_fts) VALUES ('rebuild')"))
+
+def adicionar_colunas():
+    """Acrescenta às tabelas existentes as colunas (sempre anuláveis) e os índices novos dos modelos.
+    Deve ser chamada depois de db.create_all().
+    """
+    if db.engine.dialect.name != 'sqlite':
+        return
+
+    with db.engine.begin() as conexao:
+        for coluna in COLUNAS_ADICIONADAS:
+            if coluna.name in colunas_existentes(conexao, coluna.table.name):
+                continue
+            tipo = coluna.type.compile(dialect=conexao.dialect)
+            conexao.execute(db.text(f'ALTER TABLE {coluna.table.name} ADD COLUMN {coluna.name} {tipo}'))
+
+        indices = {indice.name: indice for tabela in db.metadata.sorted_tables for indice in tabela.indexes}
+        for nome in INDICES_ADICIONADOS:
+            indices[nome].create(conexao, checkfirst=True)
+
+        # Com o índice criado, a busca por linhas nulas é barata a cada inicialização
+        for coluna, origem in PREENCHIMENTOS:
+            conexao.execute(
+                db.update(coluna.table).where(coluna.is_(None)).values({coluna.name: origem})
+            )
@@ -22,7 +22,7 @@ class User(db.Model):
     agendamentos = db.relationship('Agendamento', backref='paciente', lazy=True, foreign_keys='Agendamento.paciente_id')
     mensagens_enviadas = db.relationship('Mensagem', backref='remetente', lazy=True, foreign_keys='Mensagem.remetente_id')
     mensagens_recebidas = db.relationship('Mensagem', backref='destinatario', lazy=True, foreign_keys='Mensagem.destinatario_id')
-    documentos = db.relationship('Documento', backref='paciente', lazy=True)
+    documentos = db.relationship('Documento', backref='paciente', lazy=True, foreign_keys='Documento.paciente_id')
 
     def set_password(self, password):
         self.password_hash = generate_password_hash(password)
@@ -52,15 +52,25 @@ class Agendamento(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     paciente_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     medica_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-    data_hora = db.Column(db.DateTime, nullable=False)
+    data_hora = db.Column(db.DateTime, nullable=False, index=True)
     tipo_consulta = db.Column(db.String(50), nullable=False)  # primeira_consulta, retorno, teleconsulta
     status = db.Column(db.String(20), nullable=False, default='agendado')  # agendado, confirmado, cancelado, realizado
     observacoes = db.Column(db.Text, nullable=True)
+    lembrete_enviado_em = db.Column(db.DateTime, nullable=True)  # NULL enquanto o lembrete não foi enviado
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
     
     medica = db.relationship('User', foreign_keys=[medica_id], backref='consultas_medica')
 
+    __table_args__ = (
+        # Verificação de conflito de horário e agenda da médica
+        db.Index('ix_agendamento_medica_data_hora', 'medica_id', 'data_hora'),
+        # Janela de lembretes pendentes: lembrete_enviado_em IS NULL + faixa de data_hora
+        db.Index('ix_agendamento_lembrete', 'lembrete_enviado_em', 'data_hora'),
+        # ids nunca reutilizados: linhas arquivadas mantêm o id em agendamento_arquivo
+        {'sqlite_autoincrement': True},
+    )
+
     def to_dict(self):
         return {
             'id': self.id,
@@ -80,7 +90,16 @@ class Mensagem(db.Model):
     destinatario_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     conteudo = db.Column(db.Text, nullable=False)
     lida = db.Column(db.Boolean, default=False)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    # Alterado ao marcar como lida; marca d'água da exportação incremental
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
+
+    __table_args__ = (
+        # Última mensagem de um remetente para um destinatário (conversas e tempo de resposta)
+        db.Index('ix_mensagem_conversa', 'remetente_id', 'destinatario_id', 'created_at'),
+        # ids nunca reutilizados: linhas arquivadas mantêm o id em mensagem_arquivo
+        {'sqlite_autoincrement': True},
+    )
 
     def to_dict(self):
         return {
@@ -89,7 +108,8 @@ class Mensagem(db.Model):
             'destinatario_id': self.destinatario_id,
             'conteudo': self.conteudo,
             'lida': self.lida,
-            'created_at': self.created_at.isoformat()
+            'created_at': self.created_at.isoformat(),
+            'updated_at': self.updated_at.isoformat()
         }
 
 class Documento(db.Model):
@@ -97,8 +117,13 @@ class Documento(db.Model):
     paciente_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     nome_arquivo = db.Column(db.String(255), nullable=False)
     tipo_documento = db.Column(db.String(50), nullable=False)  # receita, atestado, exame, etc.
-    caminho_arquivo = db.Column(db.String(500), nullable=False)
+    caminho_arquivo = db.Column(db.String(500), nullable=False, index=True)
     tamanho_arquivo = db.Column(db.Integer, nullable=False)
+    # Compressão no armazenamento: codec None = arquivo gravado como enviado
+    codec = db.Column(db.String(10))
+    tamanho_armazenado = db.Column(db.Integer)
+    # Resultado da última verificação de uploads: None = ok, ausente, tamanho_divergente
+    integridade = db.Column(db.String(20))
     uploaded_by = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
@@ -111,6 +136,62 @@ class Documento(db.Model):
             'nome_arquivo': self.nome_arquivo,
             'tipo_documento': self.tipo_documento,
             'tamanho_arquivo': self.tamanho_arquivo,
+            'integridade': self.integridade,
             'uploaded_by': self.uploaded_by,
             'created_at': self.created_at.isoformat()
         }
+
+class AgendamentoArquivo(db.Model):
+    # Agendamentos realizados/cancelados antigos, movidos da tabela agendamento pelo arquivamento
+    __tablename__ = 'agendamento_arquivo'
+
+    id = db.Column(db.Integer, primary_key=True)
+    paciente_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+    medica_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    data_hora = db.Column(db.DateTime, nullable=False, index=True)
+    tipo_consulta = db.Column(db.String(50), nullable=False)
+    status = db.Column(db.String(20), nullable=False)
+    observacoes = db.Column(db.Text, nullable=True)
+    lembrete_enviado_em = db.Column(db.DateTime, nullable=True)
+    created_at = db.Column(db.DateTime)
+    updated_at = db.Column(db.DateTime, index=True)
+
+    to_dict = Agendamento.to_dict
+
+class MensagemArquivo(db.Model):
+    # Mensagens antigas, movidas da tabela mensagem pelo arquivamento
+    __tablename__ = 'mensagem_arquivo'
+
+    id = db.Column(db.Integer, primary_key=True)
+    remetente_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    destinatario_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    conteudo = db.Column(db.Text, nullable=False)
+    lida = db.Column(db.Boolean, default=False)
+    created_at = db.Column(db.DateTime, index=True)
+    updated_at = db.Column(db.DateTime, index=True)
+
+    __table_args__ = (
+        db.Index('ix_mensagem_arquivo_conversa', 'remetente_id', 'destinatario_id', 'created_at'),
+    )
+
+    to_dict = Mensagem.to_dict
+
+class ResumoAgendamentoDiario(db.Model):
+    # Agendamentos por dia (data da consulta), status e tipo de consulta
+    dia = db.Column(db.Date, primary_key=True)
+    status = db.Column(db.String(20), primary_key=True)
+    tipo_consulta = db.Column(db.String(50), primary_key=True)
+    total = db.Column(db.Integer, nullable=False, default=0)
+
+class ResumoMensagemDiario(db.Model):
+    # Mensagens por dia de envio; respostas são as mensagens da equipe que respondem o paciente
+    dia = db.Column(db.Date, primary_key=True)
+    total = db.Column(db.Integer, nullable=False, default=0)
+    respostas = db.Column(db.Integer, nullable=False, default=0)
+    soma_tempo_resposta = db.Column(db.Float, nullable=False, default=0)  # segundos
+
+class ResumoPendente(db.Model):
+    # Dias cujos resumos precisam ser recalculados
+    tipo = db.Column(db.String(20), primary_key=True)  # agendamento, mensagem
+    dia = db.Column(db.Date, primary_key=True)
+
@@ -1,10 +1,36 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from src.models.user import db, User, Agendamento
+from src.models.user import db, User, Agendamento, AgendamentoArquivo
+from src.services.estatisticas import marcar_pendentes
+from src.services.arquivamento import arquivo_alcancado
+from src.services.limite import limitar
 from datetime import datetime, timedelta
 
 agendamento_bp = Blueprint('agendamento', __name__)
 
+# Status que ocupam um horário na agenda
+STATUS_ATIVOS = ['agendado', 'confirmado']
+
+# Operações em lote: ação -> status resultante
+ACOES_LOTE = {
+    'confirmar': 'confirmado',
+    'cancelar': 'cancelado',
+    'realizar': 'realizado',
+}
+MAX_LOTE = 500
+
+# Horário de funcionamento (de hora em hora, HORA_FIM exclusiva)
+HORA_INICIO = 8
+HORA_FIM = 18
+
+# Limites para agendamentos recorrentes
+MAX_OCORRENCIAS_SERIE = 24
+MAX_INTERVALO_SEMANAS_SERIE = 52
+MAX_ALTERNATIVAS_SERIE = 3
+
+def horarios_do_dia(data):
+    return [datetime.combine(data, datetime.min.time().replace(hour=hora)) for hora in range(HORA_INICIO, HORA_FIM)]
+
 @agendamento_bp.route('/agendamentos', methods=['POST'])
 @jwt_required()
 def criar_agendamento():
@@ -69,9 +95,9 @@ def criar_agendamento():
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
-@agendamento_bp.route('/agendamentos', methods=['GET'])
+@agendamento_bp.route('/agendamentos/serie', methods=['POST'])
 @jwt_required()
-def listar_agendamentos():
+def criar_serie_agendamentos():
     try:
         user_id = get_jwt_identity()
         user = User.query.get(user_id)
@@ -79,12 +105,143 @@ def listar_agendamentos():
         if not user:
             return jsonify({'error': 'Usuário não encontrado'}), 404
         
-        # Se for paciente, mostrar apenas seus agendamentos
+        data = request.get_json() or {}
+        
+        # Validação básica
+        required_fields = ['data_hora', 'tipo_consulta', 'intervalo_semanas', 'ocorrencias']
+        for field in required_fields:
+            if field not in data or not data[field]:
+                return jsonify({'error': f'Campo {field} é obrigatório'}), 400
+        
+        intervalo_semanas = data['intervalo_semanas']
+        if not isinstance(intervalo_semanas, int) or not 1 <= intervalo_semanas <= MAX_INTERVALO_SEMANAS_SERIE:
+            return jsonify({'error': f'intervalo_semanas deve ser um inteiro entre 1 e {MAX_INTERVALO_SEMANAS_SERIE}'}), 400
+        
+        ocorrencias = data['ocorrencias']
+        if not isinstance(ocorrencias, int) or not 1 <= ocorrencias <= MAX_OCORRENCIAS_SERIE:
+            return jsonify({'error': f'ocorrencias deve ser um inteiro entre 1 e {MAX_OCORRENCIAS_SERIE}'}), 400
+        
+        # Paciente agenda para si; médica ou admin agenda para um paciente informado
         if user.role == 'paciente':
-            agendamentos = Agendamento.query.filter_by(paciente_id=user.id).order_by(Agendamento.data_hora.desc()).all()
-        # Se for médica ou admin, mostrar todos
+            paciente_id = user.id
         else:
-            agendamentos = Agendamento.query.order_by(Agendamento.data_hora.desc()).all()
+            paciente_id = data.get('paciente_id')
+            paciente = User.query.get(paciente_id) if paciente_id else None
+            if not paciente or paciente.role != 'paciente':
+                return jsonify({'error': 'Paciente não encontrado'}), 404
+        
+        # Converter data_hora da primeira ocorrência
+        try:
+            # Horários são gravados sem fuso, como em exportacao.ler_data
+            primeira = datetime.fromisoformat(data['data_hora'].replace('Z', '+00:00')).replace(tzinfo=None)
+        except ValueError:
+            return jsonify({'error': 'Formato de data/hora inválido'}), 400
+        
+        if primeira <= datetime.now():
+            return jsonify({'error': 'A data do agendamento deve ser no futuro'}), 400
+        
+        # Buscar médica (assumindo que há apenas uma médica no sistema)
+        medica = User.query.filter_by(role='medica').first()
+        if not medica:
+            return jsonify({'error': 'Médica não encontrada no sistema'}), 404
+        
+        datas = [primeira + timedelta(weeks=intervalo_semanas * i) for i in range(ocorrencias)]
+        
+        # Uma única consulta cobrindo os dias da série, usando o índice (medica_id, data_hora)
+        dias = sorted({data_hora.date() for data_hora in datas})
+        ocupados = set(db.session.scalars(
+            db.select(Agendamento.data_hora).where(
+                Agendamento.medica_id == medica.id,
+                Agendamento.status.in_(STATUS_ATIVOS),
+                db.or_(*[
+                    db.and_(
+                        Agendamento.data_hora >= datetime.combine(dia, datetime.min.time()),
+                        Agendamento.data_hora < datetime.combine(dia + timedelta(days=1), datetime.min.time())
+                    )
+                    for dia in dias
+                ])
+            )
+        ))
+        
+        # Para cada data em conflito, sugerir os horários livres mais próximos no mesmo dia
+        conflitos = []
+        agora = datetime.now()
+        for data_hora in datas:
+            if data_hora not in ocupados:
+                continue
+            livres = [
+                horario for horario in horarios_do_dia(data_hora.date())
+                if horario not in ocupados and horario > agora
+            ]
+            livres.sort(key=lambda horario: abs(horario - data_hora))
+            conflitos.append({
+                'data_hora': data_hora.isoformat(),
+                'alternativas': [horario.isoformat() for horario in livres[:MAX_ALTERNATIVAS_SERIE]]
+            })
+        
+        if conflitos:
+            return jsonify({'error': 'Horário não disponível', 'conflitos': conflitos}), 409
+        
+        # Criar a série inteira em uma única transação
+        agendamentos = [
+            Agendamento(
+                paciente_id=paciente_id,
+                medica_id=medica.id,
+                data_hora=data_hora,
+                tipo_consulta=data['tipo_consulta'],
+                observacoes=data.get('observacoes')
+            )
+            for data_hora in datas
+        ]
+        
+        db.session.add_all(agendamentos)
+        db.session.commit()
+        
+        return jsonify({
+            'message': 'Agendamentos criados com sucesso',
+            'agendamentos': [agendamento.to_dict() for agendamento in agendamentos]
+        }), 201
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+@agendamento_bp.route('/agendamentos', methods=['GET'])
+@jwt_required()
+def listar_agendamentos():
+    try:
+        user_id = get_jwt_identity()
+        user = User.query.get(user_id)
+        
+        if not user:
+            return jsonify({'error': 'Usuário não encontrado'}), 404
+        
+        # Período opcional
+        try:
+            inicio = datetime.fromisoformat(request.args['inicio']) if request.args.get('inicio') else None
+            fim = datetime.fromisoformat(request.args['fim']) if request.args.get('fim') else None
+        except ValueError:
+            return jsonify({'error': 'Formato de data inválido. Use YYYY-MM-DD'}), 400
+        
+        consultas = [(Agendamento, Agendamento.query)]
+        # O arquivo só é consultado quando o período pode alcançá-lo
+        if arquivo_alcancado(AgendamentoArquivo.data_hora, inicio):
+            consultas.append((AgendamentoArquivo, AgendamentoArquivo.query))
+        
+        agendamentos = []
+        for modelo, consulta in consultas:
+            # Se for paciente, mostrar apenas seus agendamentos
+            # Se for médica ou admin, mostrar todos
+            if user.role == 'paciente':
+                consulta = consulta.filter(modelo.paciente_id == user.id)
+            if inicio:
+                consulta = consulta.filter(modelo.data_hora >= inicio)
+            if fim:
+                consulta = consulta.filter(modelo.data_hora < fim)
+            agendamentos.extend(consulta.order_by(modelo.data_hora.desc()).all())
+        
+        if len(consultas) > 1:
+            agendamentos.sort(key=lambda agendamento: agendamento.data_hora, reverse=True)
         
         return jsonify({
             'agendamentos': [agendamento.to_dict() for agendamento in agendamentos]
@@ -123,9 +280,14 @@ def atualizar_agendamento(agendamento_id):
         # Apenas médica ou admin pode alterar data/hora
         if user.role in ['medica', 'admin'] and 'data_hora' in data:
             try:
-                agendamento.data_hora = datetime.fromisoformat(data['data_hora'].replace('Z', '+00:00'))
+                nova_data_hora = datetime.fromisoformat(data['data_hora'].replace('Z', '+00:00'))
             except ValueError:
                 return jsonify({'error': 'Formato de data/hora inválido'}), 400
+            
+            # Remarcação: o lembrete precisa ser enviado de novo para o novo horário
+            if nova_data_hora != agendamento.data_hora:
+                agendamento.data_hora = nova_data_hora
+                agendamento.lembrete_enviado_em = None
         
         agendamento.updated_at = datetime.utcnow()
         db.session.commit()
@@ -168,7 +330,192 @@ def cancelar_agendamento(agendamento_id):
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
+@agendamento_bp.route('/agendamentos/lote', methods=['POST'])
+@jwt_required()
+def atualizar_agendamentos_lote():
+    try:
+        user_id = get_jwt_identity()
+        user = User.query.get(user_id)
+        
+        if not user:
+            return jsonify({'error': 'Usuário não encontrado'}), 404
+        
+        # Apenas médica ou admin pode operar em lote sobre a agenda
+        if user.role not in ['medica', 'admin']:
+            return jsonify({'error': 'Sem permissão para alterar agendamentos em lote'}), 403
+        
+        data = request.get_json() or {}
+        
+        ids = data.get('ids')
+        # bool é subclasse de int: True não pode virar o id 1
+        if not isinstance(ids, list) or not ids or not all(isinstance(i, int) and not isinstance(i, bool) for i in ids):
+            return jsonify({'error': 'Campo ids deve ser uma lista de inteiros'}), 400
+        
+        ids = list(dict.fromkeys(ids))
+        if len(ids) > MAX_LOTE:
+            return jsonify({'error': f'Máximo de {MAX_LOTE} agendamentos por lote'}), 400
+        
+        acao = data.get('acao')
+        if acao not in ACOES_LOTE and acao != 'deslocar':
+            return jsonify({'error': 'Ação inválida. Use confirmar, cancelar, realizar ou deslocar'}), 400
+        
+        # Uma única consulta para todos os agendamentos do lote
+        agendamentos = db.session.execute(
+            db.select(Agendamento.id, Agendamento.medica_id, Agendamento.data_hora, Agendamento.status)
+            .where(Agendamento.id.in_(ids))
+        ).all()
+        
+        nao_encontrados = set(ids) - {agendamento.id for agendamento in agendamentos}
+        if nao_encontrados:
+            return jsonify({
+                'error': 'Agendamentos não encontrados',
+                'ids': sorted(nao_encontrados)
+            }), 404
+        
+        agora = datetime.utcnow()
+        
+        if acao == 'deslocar':
+            minutos = data.get('deslocamento_minutos')
+            # A agenda é de hora em hora: deslocamentos menores criariam horários sobrepostos
+            if not isinstance(minutos, int) or isinstance(minutos, bool) or minutos == 0 or minutos % 60:
+                return jsonify({'error': 'Campo deslocamento_minutos deve ser um múltiplo de 60 diferente de zero'}), 400
+            
+            inativos = [agendamento.id for agendamento in agendamentos if agendamento.status not in STATUS_ATIVOS]
+            if inativos:
+                return jsonify({
+                    'error': 'Apenas agendamentos ativos podem ser remarcados',
+                    'ids': sorted(inativos)
+                }), 400
+            
+            deslocamento = timedelta(minutes=minutos)
+            novos_horarios = {
+                agendamento.id: (agendamento.medica_id, agendamento.data_hora + deslocamento)
+                for agendamento in agendamentos
+            }
+            
+            # Mesma regra da criação: não remarcar para o passado
+            passados = [
+                agendamento_id for agendamento_id, (_, data_hora) in novos_horarios.items()
+                if data_hora <= datetime.now()
+            ]
+            if passados:
+                return jsonify({
+                    'error': 'A data do agendamento deve ser no futuro',
+                    'ids': sorted(passados)
+                }), 400
+            
+            fora_do_horario = [
+                agendamento_id for agendamento_id, (_, data_hora) in novos_horarios.items()
+                if data_hora not in horarios_do_dia(data_hora.date())
+            ]
+            if fora_do_horario:
+                return jsonify({
+                    'error': 'Fora do horário de funcionamento',
+                    'ids': sorted(fora_do_horario)
+                }), 400
+            
+            # Conflitos dentro do próprio lote
+            conflitos = []
+            ocupados = {}
+            for agendamento_id, horario in novos_horarios.items():
+                if horario in ocupados:
+                    conflitos.append({
+                        'id': agendamento_id,
+                        'data_hora': horario[1].isoformat(),
+                        'conflita_com': ocupados[horario]
+                    })
+                else:
+                    ocupados[horario] = agendamento_id
+            
+            # Conflitos com agendamentos ativos fora do lote, em uma única consulta
+            existentes = db.session.execute(
+                db.select(Agendamento.id, Agendamento.medica_id, Agendamento.data_hora).where(
+                    Agendamento.medica_id.in_({medica_id for medica_id, _ in ocupados}),
+                    Agendamento.data_hora.in_({data_hora for _, data_hora in ocupados}),
+                    Agendamento.status.in_(STATUS_ATIVOS),
+                    Agendamento.id.not_in(ids)
+                )
+            ).all()
+            for existente in existentes:
+                horario = (existente.medica_id, existente.data_hora)
+                if horario in ocupados:
+                    conflitos.append({
+                        'id': ocupados[horario],
+                        'data_hora': existente.data_hora.isoformat(),
+                        'conflita_com': existente.id
+                    })
+            
+            if conflitos:
+                return jsonify({'error': 'Horário não disponível', 'conflitos': conflitos}), 409
+            
+            db.session.execute(db.update(Agendamento), [
+                {'id': agendamento_id, 'data_hora': data_hora, 'lembrete_enviado_em': None, 'updated_at': agora}
+                for agendamento_id, (_, data_hora) in novos_horarios.items()
+            ])
+        else:
+            if ACOES_LOTE[acao] in STATUS_ATIVOS:
+                # Agendamentos cancelados/realizados voltam a ocupar o horário: o horário pode
+                # ter sido reservado por outro paciente nesse meio tempo
+                reativados = {
+                    agendamento.id: (agendamento.medica_id, agendamento.data_hora)
+                    for agendamento in agendamentos if agendamento.status not in STATUS_ATIVOS
+                }
+                conflitos = []
+                ocupados = {}
+                for agendamento_id, horario in reativados.items():
+                    if horario in ocupados:
+                        conflitos.append({
+                            'id': agendamento_id,
+                            'data_hora': horario[1].isoformat(),
+                            'conflita_com': ocupados[horario]
+                        })
+                    else:
+                        ocupados[horario] = agendamento_id
+                
+                if ocupados:
+                    existentes = db.session.execute(
+                        db.select(Agendamento.id, Agendamento.medica_id, Agendamento.data_hora).where(
+                            Agendamento.medica_id.in_({medica_id for medica_id, _ in ocupados}),
+                            Agendamento.data_hora.in_({data_hora for _, data_hora in ocupados}),
+                            Agendamento.status.in_(STATUS_ATIVOS)
+                        )
+                    ).all()
+                    for existente in existentes:
+                        horario = (existente.medica_id, existente.data_hora)
+                        if horario in ocupados:
+                            conflitos.append({
+                                'id': ocupados[horario],
+                                'data_hora': existente.data_hora.isoformat(),
+                                'conflita_com': existente.id
+                            })
+                
+                if conflitos:
+                    return jsonify({'error': 'Horário não disponível', 'conflitos': conflitos}), 409
+            
+            Agendamento.query.filter(Agendamento.id.in_(ids)).update(
+                {'status': ACOES_LOTE[acao], 'updated_at': agora},
+                synchronize_session=False
+            )
+        
+        # UPDATEs em massa não passam pelo before_flush: marcar os dias afetados aqui
+        dias = {agendamento.data_hora.date() for agendamento in agendamentos}
+        if acao == 'deslocar':
+            dias.update(data_hora.date() for _, data_hora in novos_horarios.values())
+        marcar_pendentes(db.session, 'agendamento', dias)
+        
+        db.session.commit()
+        
+        return jsonify({
+            'message': 'Agendamentos atualizados com sucesso',
+            'atualizados': len(ids)
+        }), 200
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
 @agendamento_bp.route('/horarios-disponiveis', methods=['GET'])
+@limitar(capacidade=30, por_segundo=2)
 def horarios_disponiveis():
     try:
         # Parâmetros de consulta
@@ -186,16 +533,14 @@ def horarios_disponiveis():
         if not medica:
             return jsonify({'error': 'Médica não encontrada no sistema'}), 404
         
-        # Horários de funcionamento (8h às 18h, de hora em hora)
-        horarios_funcionamento = []
-        for hora in range(8, 18):
-            horarios_funcionamento.append(datetime.combine(data, datetime.min.time().replace(hour=hora)))
+        # Horários de funcionamento (de hora em hora)
+        horarios_funcionamento = horarios_do_dia(data)
         
         # Buscar agendamentos existentes para a data
         agendamentos_existentes = Agendamento.query.filter(
             Agendamento.medica_id == medica.id,
             db.func.date(Agendamento.data_hora) == data,
-            Agendamento.status.in_(['agendado', 'confirmado'])
+            Agendamento.status.in_(STATUS_ATIVOS)
         ).all()
         
         horarios_ocupados = [agendamento.data_hora for agendamento in agendamentos_existentes]
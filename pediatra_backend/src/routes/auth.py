@@ -1,11 +1,13 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import JWTManager, create_access_token, jwt_required, get_jwt_identity
 from src.models.user import db, User
+from src.services.limite import limitar
 from datetime import datetime
 
 auth_bp = Blueprint('auth', __name__)
 
 @auth_bp.route('/register', methods=['POST'])
+@limitar(capacidade=5, por_segundo=0.05)
 def register():
     try:
         data = request.get_json()
@@ -55,6 +57,7 @@ def register():
         return jsonify({'error': str(e)}), 500
 
 @auth_bp.route('/login', methods=['POST'])
+@limitar(capacidade=5, por_segundo=0.1)
 def login():
     try:
         data = request.get_json()
@@ -1,17 +1,29 @@
-from flask import Blueprint, request, jsonify, send_file
+from flask import Blueprint, request, jsonify, send_file, Response, stream_with_context, current_app
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from src.models.user import db, User, Documento
+from src.services.limite import limitar
+from src.services.armazenamento import salvar_documento, abrir_documento
+from src.services.integridade import verificar_uploads, AUSENTE
 from werkzeug.utils import secure_filename
+import click
 import os
+import zipfile
 from datetime import datetime
 
 documento_bp = Blueprint('documento', __name__)
 
 # Configurações de upload
 UPLOAD_FOLDER = 'uploads'
+# Arquivos sem registro no banco, movidos pela verificação de uploads
+QUARENTENA_FOLDER = 'uploads_quarentena'
 ALLOWED_EXTENSIONS = {'pdf', 'jpg', 'jpeg', 'png', 'doc', 'docx'}
 MAX_FILE_SIZE = 16 * 1024 * 1024  # 16MB
 
+# Exportação em ZIP
+TAMANHO_BLOCO_ZIP = 64 * 1024
+# Formatos já comprimidos são armazenados sem nova compressão no ZIP
+EXTENSOES_SEM_COMPRESSAO = {'pdf', 'jpg', 'jpeg', 'png', 'docx'}
+
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
@@ -19,6 +31,55 @@ def create_upload_folder():
     if not os.path.exists(UPLOAD_FOLDER):
         os.makedirs(UPLOAD_FOLDER)
 
+class SaidaZip:
+    """Destino não-posicionável para o ZipFile: acumula os bytes até serem retirados."""
+
+    def __init__(self):
+        self.partes = []
+
+    def write(self, dados):
+        self.partes.append(bytes(dados))
+        return len(dados)
+
+    def flush(self):
+        pass
+
+    def retirar(self):
+        dados = b''.join(self.partes)
+        self.partes = []
+        return dados
+
+def gerar_zip(documentos):
+    """Gera o ZIP em blocos, lendo cada arquivo aos poucos; a memória fica limitada a um bloco."""
+    saida = SaidaZip()
+    with zipfile.ZipFile(saida, 'w') as arquivo_zip:
+        for documento in documentos:
+            try:
+                origem = abrir_documento(documento)
+            except FileNotFoundError:
+                continue
+            
+            nome = secure_filename(documento.nome_arquivo) or 'arquivo'
+            info = zipfile.ZipInfo(
+                f"{secure_filename(documento.tipo_documento) or 'documento'}/{documento.id}_{nome}",
+                date_time=documento.created_at.timetuple()[:6]
+            )
+            extensao = nome.rsplit('.', 1)[-1].lower()
+            info.compress_type = zipfile.ZIP_STORED if extensao in EXTENSOES_SEM_COMPRESSAO else zipfile.ZIP_DEFLATED
+            
+            with origem, arquivo_zip.open(info, 'w') as destino:
+                while True:
+                    bloco = origem.read(TAMANHO_BLOCO_ZIP)
+                    if not bloco:
+                        break
+                    destino.write(bloco)
+                    dados = saida.retirar()
+                    if dados:
+                        yield dados
+            yield saida.retirar()
+    # Diretório central
+    yield saida.retirar()
+
 @documento_bp.route('/documentos', methods=['POST'])
 @jwt_required()
 def upload_documento():
@@ -80,8 +141,10 @@ def upload_documento():
         
         file_path = os.path.join(patient_folder, filename)
         
-        # Salvar arquivo
-        file.save(file_path)
+        # Salvar arquivo (comprimido, se configurado e se o formato se beneficiar)
+        file_path, codec, tamanho_armazenado = salvar_documento(
+            file.stream, file_path, current_app.config.get('DOCUMENTOS_COMPRESSAO')
+        )
         
         # Criar registro no banco de dados
         documento = Documento(
@@ -90,6 +153,8 @@ def upload_documento():
             tipo_documento=tipo_documento,
             caminho_arquivo=file_path,
             tamanho_arquivo=file_size,
+            codec=codec,
+            tamanho_armazenado=tamanho_armazenado,
             uploaded_by=user.id
         )
         
@@ -151,14 +216,71 @@ def download_documento(documento_id):
         if user.role == 'paciente' and documento.paciente_id != user.id:
             return jsonify({'error': 'Sem permissão para acessar este documento'}), 403
         
-        # Verificar se o arquivo existe
-        if not os.path.exists(documento.caminho_arquivo):
+        # A verificação de uploads marca arquivos ausentes; os demais são abertos sem checagem prévia
+        if documento.integridade == AUSENTE:
             return jsonify({'error': 'Arquivo não encontrado no servidor'}), 404
         
-        return send_file(
-            documento.caminho_arquivo,
-            as_attachment=True,
-            download_name=documento.nome_arquivo
+        # send_file resolveria um caminho relativo a partir de app.root_path; upload, ZIP e
+        # verificação usam o diretório de trabalho
+        caminho_arquivo = os.path.abspath(documento.caminho_arquivo)
+        
+        if not documento.codec:
+            return send_file(
+                caminho_arquivo,
+                as_attachment=True,
+                download_name=documento.nome_arquivo
+            )
+        
+        # Cliente aceita o codec: envia os bytes armazenados sem descomprimir
+        if request.accept_encodings[documento.codec] > 0:
+            resposta = send_file(
+                caminho_arquivo,
+                as_attachment=True,
+                download_name=documento.nome_arquivo
+            )
+            resposta.headers['Content-Encoding'] = documento.codec
+        else:
+            # Descomprime em blocos durante o envio
+            resposta = send_file(
+                abrir_documento(documento),
+                as_attachment=True,
+                download_name=documento.nome_arquivo,
+                conditional=False
+            )
+            resposta.content_length = documento.tamanho_arquivo
+        resposta.headers['Vary'] = 'Accept-Encoding'
+        return resposta
+        
+    except FileNotFoundError:
+        return jsonify({'error': 'Arquivo não encontrado no servidor'}), 404
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@documento_bp.route('/pacientes/<int:paciente_id>/documentos.zip', methods=['GET'])
+@limitar(capacidade=5, por_segundo=0.1)
+@jwt_required()
+def exportar_documentos_zip(paciente_id):
+    try:
+        user_id = get_jwt_identity()
+        user = User.query.get(user_id)
+        
+        if not user:
+            return jsonify({'error': 'Usuário não encontrado'}), 404
+        
+        # Paciente exporta apenas os próprios documentos
+        if user.role == 'paciente' and paciente_id != user.id:
+            return jsonify({'error': 'Sem permissão para acessar estes documentos'}), 403
+        
+        paciente = User.query.get(paciente_id)
+        if not paciente or paciente.role != 'paciente':
+            return jsonify({'error': 'Paciente não encontrado'}), 404
+        
+        documentos = Documento.query.filter_by(paciente_id=paciente_id).order_by(Documento.created_at.asc()).all()
+        
+        return Response(
+            stream_with_context(gerar_zip(documentos)),
+            mimetype='application/zip',
+            headers={'Content-Disposition': f'attachment; filename=documentos_paciente_{paciente_id}.zip'}
         )
         
     except Exception as e:
@@ -182,17 +304,36 @@ def deletar_documento(documento_id):
         if not documento:
             return jsonify({'error': 'Documento não encontrado'}), 404
         
-        # Deletar arquivo do sistema de arquivos
-        if os.path.exists(documento.caminho_arquivo):
-            os.remove(documento.caminho_arquivo)
-        
-        # Deletar registro do banco de dados
+        # Deletar registro do banco de dados antes do arquivo: se o processo cair no meio,
+        # sobra um arquivo órfão, que a verificação de uploads move para a quarentena
+        caminho_arquivo = documento.caminho_arquivo
         db.session.delete(documento)
         db.session.commit()
         
+        # Deletar arquivo do sistema de arquivos
+        try:
+            os.remove(caminho_arquivo)
+        except FileNotFoundError:
+            pass
+        
         return jsonify({'message': 'Documento deletado com sucesso'}), 200
         
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
+@documento_bp.cli.command('verificar')
+@click.option('--carencia-minutos', type=int, default=60, help='Idade mínima de um arquivo sem registro para ir à quarentena')
+@click.option('--lote', type=int, default=1000, help='Documentos conferidos por transação')
+def verificar_uploads_comando(carencia_minutos, lote):
+    """Confere os arquivos de upload com o banco e move órfãos para a quarentena."""
+    try:
+        total = verificar_uploads(UPLOAD_FOLDER, QUARENTENA_FOLDER, carencia_segundos=carencia_minutos * 60, tamanho_lote=lote)
+    except FileNotFoundError as e:
+        raise click.ClickException(str(e))
+    click.echo(
+        f"{total['verificados']} documentos verificados: {total['ausente']} ausentes, "
+        f"{total['tamanho_divergente']} com tamanho divergente, {total['orfaos']} arquivos órfãos em quarentena"
+    )
+    if total['sem_diretorio']:
+        click.echo(f"{total['sem_diretorio']} documentos não verificados: diretório do paciente não encontrado")
@@ -0,0 +1,156 @@
+from flask import Blueprint, request, jsonify
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from src.models.user import db, User, ResumoAgendamentoDiario, ResumoMensagemDiario
+from src.services.estatisticas import atualizar_resumos, reconstruir_resumos
+from src.services.limite import limitar
+from datetime import datetime, date, timedelta
+import click
+import threading
+import time
+
+estatisticas_bp = Blueprint('estatisticas', __name__)
+
+# Período padrão do painel e validade do cache em memória
+DIAS_PADRAO_ESTATISTICAS = 30
+CACHE_ESTATISTICAS_SEGUNDOS = 60
+# Períodos vêm do cliente: limita o número de entradas guardadas
+MAX_ENTRADAS_CACHE = 256
+
+_cache = {}
+_cache_lock = threading.Lock()
+
+def limpar_cache():
+    with _cache_lock:
+        _cache.clear()
+
+def montar_estatisticas(inicio, fim):
+    """Lê os resumos do período [inicio, fim] e calcula as taxas do painel."""
+    hoje = date.today()
+    agendamentos = {}
+    resumo = {
+        'agendamentos': 0,
+        'cancelamentos': 0,
+        'faltas': 0,
+        'agendamentos_passados': 0,
+        'mensagens': 0,
+        'respostas': 0,
+        'soma_tempo_resposta': 0.0
+    }
+
+    linhas = ResumoAgendamentoDiario.query.filter(
+        ResumoAgendamentoDiario.dia >= inicio,
+        ResumoAgendamentoDiario.dia <= fim
+    ).order_by(ResumoAgendamentoDiario.dia).all()
+
+    for linha in linhas:
+        dia = agendamentos.setdefault(linha.dia, {
+            'dia': linha.dia.isoformat(),
+            'total': 0,
+            'por_status': {},
+            'por_tipo_consulta': {}
+        })
+        dia['total'] += linha.total
+        dia['por_status'][linha.status] = dia['por_status'].get(linha.status, 0) + linha.total
+        dia['por_tipo_consulta'][linha.tipo_consulta] = dia['por_tipo_consulta'].get(linha.tipo_consulta, 0) + linha.total
+
+        resumo['agendamentos'] += linha.total
+        if linha.status == 'cancelado':
+            resumo['cancelamentos'] += linha.total
+        elif linha.dia < hoje:
+            # Consulta passada que não foi marcada como realizada conta como falta
+            resumo['agendamentos_passados'] += linha.total
+            if linha.status in ['agendado', 'confirmado']:
+                resumo['faltas'] += linha.total
+
+    mensagens = []
+    for linha in ResumoMensagemDiario.query.filter(
+        ResumoMensagemDiario.dia >= inicio,
+        ResumoMensagemDiario.dia <= fim
+    ).order_by(ResumoMensagemDiario.dia):
+        mensagens.append({
+            'dia': linha.dia.isoformat(),
+            'total': linha.total,
+            'respostas': linha.respostas,
+            'tempo_medio_resposta_segundos': linha.soma_tempo_resposta / linha.respostas if linha.respostas else None
+        })
+        resumo['mensagens'] += linha.total
+        resumo['respostas'] += linha.respostas
+        resumo['soma_tempo_resposta'] += linha.soma_tempo_resposta
+
+    return {
+        'inicio': inicio.isoformat(),
+        'fim': fim.isoformat(),
+        'agendamentos': list(agendamentos.values()),
+        'mensagens': mensagens,
+        'resumo': {
+            'agendamentos': resumo['agendamentos'],
+            'cancelamentos': resumo['cancelamentos'],
+            'taxa_cancelamento': resumo['cancelamentos'] / resumo['agendamentos'] if resumo['agendamentos'] else None,
+            'faltas': resumo['faltas'],
+            'taxa_falta': resumo['faltas'] / resumo['agendamentos_passados'] if resumo['agendamentos_passados'] else None,
+            'mensagens': resumo['mensagens'],
+            'respostas': resumo['respostas'],
+            'tempo_medio_resposta_segundos': resumo['soma_tempo_resposta'] / resumo['respostas'] if resumo['respostas'] else None
+        }
+    }
+
+@estatisticas_bp.route('/estatisticas', methods=['GET'])
+@limitar(capacidade=30, por_segundo=1)
+@jwt_required()
+def obter_estatisticas():
+    try:
+        user_id = get_jwt_identity()
+        user = User.query.get(user_id)
+
+        if not user:
+            return jsonify({'error': 'Usuário não encontrado'}), 404
+
+        # Apenas médica e admin acessam o painel
+        if user.role not in ['medica', 'admin']:
+            return jsonify({'error': 'Sem permissão para acessar estatísticas'}), 403
+
+        try:
+            fim = datetime.strptime(request.args['fim'], '%Y-%m-%d').date() if request.args.get('fim') else date.today()
+            inicio = datetime.strptime(request.args['inicio'], '%Y-%m-%d').date() if request.args.get('inicio') \
+                else fim - timedelta(days=DIAS_PADRAO_ESTATISTICAS - 1)
+        except ValueError:
+            return jsonify({'error': 'Formato de data inválido. Use YYYY-MM-DD'}), 400
+
+        if inicio > fim:
+            return jsonify({'error': 'inicio deve ser anterior ou igual a fim'}), 400
+
+        chave = (inicio, fim)
+        agora = time.monotonic()
+        with _cache_lock:
+            em_cache = _cache.get(chave)
+        if em_cache and em_cache[0] > agora:
+            return jsonify(em_cache[1]), 200
+
+        # Recalcula apenas os dias alterados desde a última leitura
+        if atualizar_resumos():
+            limpar_cache()
+
+        estatisticas = montar_estatisticas(inicio, fim)
+        with _cache_lock:
+            # Descarta entradas expiradas; se ainda estiver cheio, as mais antigas saem primeiro
+            for antiga in [c for c, (expira, _) in _cache.items() if expira <= agora]:
+                del _cache[antiga]
+            while len(_cache) >= MAX_ENTRADAS_CACHE:
+                del _cache[next(iter(_cache))]
+            _cache[chave] = (agora + CACHE_ESTATISTICAS_SEGUNDOS, estatisticas)
+
+        return jsonify(estatisticas), 200
+
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+@estatisticas_bp.cli.command('atualizar')
+def atualizar_resumos_comando():
+    """Recalcula os resumos dos dias alterados."""
+    click.echo(f'{atualizar_resumos()} dias recalculados')
+
+@estatisticas_bp.cli.command('reconstruir')
+def reconstruir_resumos_comando():
+    """Recalcula os resumos de todo o histórico."""
+    click.echo(f'{reconstruir_resumos()} dias recalculados')
@@ -0,0 +1,190 @@
+from flask import Blueprint, request, jsonify, Response, stream_with_context
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from src.models.user import db, User, Agendamento, Mensagem, AgendamentoArquivo, MensagemArquivo
+from src.services.arquivamento import arquivo_alcancado
+from src.services.limite import limitar
+from datetime import datetime
+import csv
+import io
+import itertools
+import json
+
+exportacao_bp = Blueprint('exportacao', __name__)
+
+# Linhas lidas do banco e serializadas por vez
+TAMANHO_LOTE_EXPORTACAO = 1000
+
+CAMPOS_AGENDAMENTO = ['id', 'paciente_id', 'medica_id', 'data_hora', 'tipo_consulta', 'status',
+                      'observacoes', 'created_at', 'updated_at']
+CAMPOS_MENSAGEM = ['id', 'remetente_id', 'destinatario_id', 'conteudo', 'lida', 'created_at', 'updated_at']
+
+def ler_data(nome):
+    """Lê um parâmetro de data/hora ISO da query string. Levanta ValueError se inválido."""
+    valor = request.args.get(nome)
+    if not valor:
+        return None
+    try:
+        return datetime.fromisoformat(valor.replace('Z', '+00:00')).replace(tzinfo=None)
+    except ValueError:
+        raise ValueError(f'Parâmetro {nome} inválido. Use o formato ISO (YYYY-MM-DD ou YYYY-MM-DDTHH:MM:SS)')
+
+def gerar_ndjson(registros):
+    linhas = []
+    for registro in registros:
+        linhas.append(json.dumps(registro.to_dict(), ensure_ascii=False))
+        if len(linhas) >= TAMANHO_LOTE_EXPORTACAO:
+            yield '\n'.join(linhas) + '\n'
+            linhas = []
+    if linhas:
+        yield '\n'.join(linhas) + '\n'
+
+def gerar_csv(registros, campos):
+    buffer = io.StringIO()
+    escritor = csv.DictWriter(buffer, fieldnames=campos)
+    escritor.writeheader()
+    contador = 0
+    for registro in registros:
+        escritor.writerow(registro.to_dict())
+        contador += 1
+        if contador % TAMANHO_LOTE_EXPORTACAO == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+def resposta_exportacao(consultas, campos, nome, ate):
+    """Responde com as consultas serializadas em streaming, uma após a outra, lendo o banco em lotes."""
+    formato = request.args.get('formato', 'ndjson')
+
+    # yield_per percorre o cursor em lotes em vez de materializar o resultado inteiro
+    registros = itertools.chain.from_iterable(
+        db.session.scalars(consulta.execution_options(yield_per=TAMANHO_LOTE_EXPORTACAO))
+        for consulta in consultas
+    )
+
+    if formato == 'csv':
+        corpo = gerar_csv(registros, campos)
+        mimetype = 'text/csv'
+    else:
+        corpo = gerar_ndjson(registros)
+        mimetype = 'application/x-ndjson'
+
+    return Response(
+        stream_with_context(corpo),
+        mimetype=mimetype,
+        headers={
+            'Content-Disposition': f'attachment; filename={nome}.{formato}',
+            # Valor a ser enviado em since= na próxima exportação incremental
+            'X-Proximo-Since': ate.isoformat()
+        }
+    )
+
+def validar_exportacao():
+    """Retorna (resposta de erro, None) ou (None, usuário)."""
+    user_id = get_jwt_identity()
+    user = User.query.get(user_id)
+
+    if not user:
+        return (jsonify({'error': 'Usuário não encontrado'}), 404), None
+
+    # Apenas médica e admin podem exportar dados
+    if user.role not in ['medica', 'admin']:
+        return (jsonify({'error': 'Sem permissão para exportar dados'}), 403), None
+
+    if request.args.get('formato', 'ndjson') not in ['ndjson', 'csv']:
+        return (jsonify({'error': 'Formato inválido. Use ndjson ou csv'}), 400), None
+
+    return None, user
+
+@exportacao_bp.route('/exportacao/agendamentos', methods=['GET'])
+@limitar(capacidade=5, por_segundo=0.1)
+@jwt_required()
+def exportar_agendamentos():
+    try:
+        erro, user = validar_exportacao()
+        if erro:
+            return erro
+
+        try:
+            inicio = ler_data('inicio')
+            fim = ler_data('fim')
+            since = ler_data('since')
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        # Corte fixo no início da exportação: alterações posteriores ficam para a próxima
+        ate = datetime.utcnow()
+
+        # O arquivo (linhas mais antigas) é exportado antes, e só quando o período o alcança
+        modelos = [Agendamento]
+        if since:
+            if arquivo_alcancado(AgendamentoArquivo.updated_at, since):
+                modelos.insert(0, AgendamentoArquivo)
+        elif arquivo_alcancado(AgendamentoArquivo.data_hora, inicio):
+            modelos.insert(0, AgendamentoArquivo)
+
+        consultas = []
+        for modelo in modelos:
+            consulta = db.select(modelo).where(modelo.updated_at < ate)
+            if inicio:
+                consulta = consulta.where(modelo.data_hora >= inicio)
+            if fim:
+                consulta = consulta.where(modelo.data_hora < fim)
+            if since:
+                # Incremental: apenas o que foi criado ou alterado desde a última exportação
+                consulta = consulta.where(modelo.updated_at >= since)
+                consulta = consulta.order_by(modelo.updated_at, modelo.id)
+            else:
+                consulta = consulta.order_by(modelo.data_hora, modelo.id)
+            consultas.append(consulta)
+
+        return resposta_exportacao(consultas, CAMPOS_AGENDAMENTO, 'agendamentos', ate)
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@exportacao_bp.route('/exportacao/mensagens', methods=['GET'])
+@limitar(capacidade=5, por_segundo=0.1)
+@jwt_required()
+def exportar_mensagens():
+    try:
+        erro, user = validar_exportacao()
+        if erro:
+            return erro
+
+        try:
+            inicio = ler_data('inicio')
+            fim = ler_data('fim')
+            since = ler_data('since')
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        # Corte fixo no início da exportação: mensagens marcadas como lidas depois ficam para a próxima
+        ate = datetime.utcnow()
+
+        modelos = [Mensagem]
+        if since:
+            if arquivo_alcancado(MensagemArquivo.updated_at, since) and arquivo_alcancado(MensagemArquivo.created_at, inicio):
+                modelos.insert(0, MensagemArquivo)
+        elif arquivo_alcancado(MensagemArquivo.created_at, inicio):
+            modelos.insert(0, MensagemArquivo)
+
+        consultas = []
+        for modelo in modelos:
+            consulta = db.select(modelo).where(modelo.updated_at < ate)
+            if inicio:
+                consulta = consulta.where(modelo.created_at >= inicio)
+            if fim:
+                consulta = consulta.where(modelo.created_at < fim)
+            if since:
+                # Incremental: apenas o que foi criado ou alterado (lida) desde a última exportação
+                consulta = consulta.where(modelo.updated_at >= since)
+                consulta = consulta.order_by(modelo.updated_at, modelo.id)
+            else:
+                consulta = consulta.order_by(modelo.created_at, modelo.id)
+            consultas.append(consulta)
+
+        return resposta_exportacao(consultas, CAMPOS_MENSAGEM, 'mensagens', ate)
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
@@ -0,0 +1,214 @@
+from flask import Blueprint, request, jsonify
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from src.models.user import db, User
+from src.services.limite import limitar
+from werkzeug.security import generate_password_hash
+from sqlalchemy.exc import IntegrityError
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import click
+import codecs
+import csv
+import json
+import os
+
+importacao_bp = Blueprint('importacao', __name__)
+
+# Linhas validadas e inseridas por transação
+TAMANHO_LOTE = 500
+# Threads usadas para calcular os hashes de senha de um lote
+THREADS_HASH = os.cpu_count() or 4
+
+CAMPOS_OBRIGATORIOS = ['username', 'email', 'password', 'nome_completo']
+CAMPOS_TEXTO = CAMPOS_OBRIGATORIOS + ['cpf', 'telefone', 'endereco']
+
+def ler_csv(stream):
+    texto = codecs.getreader('utf-8-sig')(stream)
+    for linha in csv.DictReader(texto):
+        yield {campo: (valor.strip() if isinstance(valor, str) else valor) for campo, valor in linha.items() if campo}
+
+def ler_ndjson(stream):
+    texto = codecs.getreader('utf-8')(stream)
+    for linha in texto:
+        linha = linha.strip()
+        if not linha:
+            continue
+        try:
+            registro = json.loads(linha)
+        except ValueError:
+            registro = None
+        yield registro if isinstance(registro, dict) else {'_invalida': True}
+
+def validar_linha(dados):
+    if dados.get('_invalida'):
+        return None, ['Linha NDJSON inválida']
+
+    erros = []
+    # NDJSON aceita qualquer tipo JSON; só texto pode seguir para as consultas e o INSERT
+    for campo in CAMPOS_TEXTO:
+        valor = dados.get(campo)
+        if valor is not None and not isinstance(valor, str):
+            erros.append(f'Campo {campo} deve ser texto')
+        elif campo in CAMPOS_OBRIGATORIOS and not valor:
+            erros.append(f'Campo {campo} é obrigatório')
+
+    data_nascimento = None
+    if dados.get('data_nascimento'):
+        try:
+            data_nascimento = datetime.strptime(dados['data_nascimento'], '%Y-%m-%d').date()
+        except (TypeError, ValueError):
+            erros.append('Formato de data inválido. Use YYYY-MM-DD')
+
+    if erros:
+        return None, erros
+
+    return {
+        'username': dados['username'],
+        'email': dados['email'],
+        'password': dados['password'],
+        'nome_completo': dados['nome_completo'],
+        'telefone': dados.get('telefone') or None,
+        'cpf': dados.get('cpf') or None,
+        'endereco': dados.get('endereco') or None,
+        'data_nascimento': data_nascimento,
+    }, []
+
+def valores_existentes(coluna, valores):
+    """Retorna quais dos valores já existem na coluna, com uma única consulta."""
+    valores = [valor for valor in valores if valor]
+    if not valores:
+        return set()
+    return set(db.session.scalars(db.select(coluna).where(coluna.in_(valores))))
+
+def processar_lote(lote, vistos, executor):
+    """Valida e insere um lote de (numero_linha, dados). Retorna (importados, erros)."""
+    erros = []
+    candidatos = []
+
+    for numero, dados in lote:
+        usuario, erros_linha = validar_linha(dados)
+        if erros_linha:
+            erros.append({'linha': numero, 'erros': erros_linha})
+        else:
+            candidatos.append((numero, usuario))
+
+    # Unicidade contra o banco, uma consulta por coluna para o lote inteiro
+    existentes = {
+        'username': valores_existentes(User.username, [u['username'] for _, u in candidatos]),
+        'email': valores_existentes(User.email, [u['email'] for _, u in candidatos]),
+        'cpf': valores_existentes(User.cpf, [u['cpf'] for _, u in candidatos]),
+    }
+    mensagens = {
+        'username': 'Nome de usuário já existe',
+        'email': 'E-mail já está em uso',
+        'cpf': 'CPF já cadastrado',
+    }
+
+    validos = []
+    for numero, usuario in candidatos:
+        erros_linha = []
+        for campo, mensagem in mensagens.items():
+            valor = usuario[campo]
+            if valor and (valor in existentes[campo] or valor in vistos[campo]):
+                erros_linha.append(mensagem)
+        if erros_linha:
+            erros.append({'linha': numero, 'erros': erros_linha})
+            continue
+        for campo in mensagens:
+            if usuario[campo]:
+                vistos[campo].add(usuario[campo])
+        validos.append((numero, usuario))
+
+    if not validos:
+        return 0, erros
+
+    # O hash de senha domina o custo; hashlib libera o GIL, então as threads rendem
+    hashes = executor.map(generate_password_hash, [usuario.pop('password') for _, usuario in validos])
+    agora = datetime.utcnow()
+    registros = []
+    for (_, usuario), password_hash in zip(validos, hashes):
+        usuario.update(password_hash=password_hash, role='paciente', created_at=agora, updated_at=agora)
+        registros.append(usuario)
+
+    try:
+        db.session.execute(User.__table__.insert(), registros)
+        db.session.commit()
+    except IntegrityError:
+        # Conflito com um cadastro concorrente: o lote inteiro é descartado
+        db.session.rollback()
+        for numero, _ in validos:
+            erros.append({'linha': numero, 'erros': ['Conflito de unicidade ao inserir; reenvie a linha']})
+        return 0, erros
+
+    return len(registros), erros
+
+def importar_pacientes(linhas):
+    """Importa pacientes a partir de um iterável de dicionários, em lotes."""
+    relatorio = {'total': 0, 'importados': 0, 'erros': []}
+    vistos = {'username': set(), 'email': set(), 'cpf': set()}
+    lote = []
+
+    with ThreadPoolExecutor(max_workers=THREADS_HASH) as executor:
+        for numero, dados in enumerate(linhas, start=1):
+            relatorio['total'] += 1
+            lote.append((numero, dados))
+            if len(lote) >= TAMANHO_LOTE:
+                importados, erros = processar_lote(lote, vistos, executor)
+                relatorio['importados'] += importados
+                relatorio['erros'].extend(erros)
+                lote = []
+
+        if lote:
+            importados, erros = processar_lote(lote, vistos, executor)
+            relatorio['importados'] += importados
+            relatorio['erros'].extend(erros)
+
+    relatorio['erros'].sort(key=lambda erro: erro['linha'])
+    return relatorio
+
+@importacao_bp.route('/pacientes/importar', methods=['POST'])
+@limitar(capacidade=2, por_segundo=0.01)
+@jwt_required()
+def importar_pacientes_endpoint():
+    try:
+        user_id = get_jwt_identity()
+        user = User.query.get(user_id)
+
+        if not user:
+            return jsonify({'error': 'Usuário não encontrado'}), 404
+
+        # Apenas admin pode importar pacientes em massa
+        if user.role != 'admin':
+            return jsonify({'error': 'Sem permissão para importar pacientes'}), 403
+
+        # O corpo é lido como stream, sem carregar o arquivo inteiro em memória
+        if request.mimetype == 'text/csv':
+            linhas = ler_csv(request.stream)
+        elif request.mimetype in ['application/x-ndjson', 'application/ndjson']:
+            linhas = ler_ndjson(request.stream)
+        else:
+            return jsonify({'error': 'Content-Type deve ser text/csv ou application/x-ndjson'}), 415
+
+        relatorio = importar_pacientes(linhas)
+
+        return jsonify(relatorio), 200
+
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+@importacao_bp.cli.command('pacientes')
+@click.argument('arquivo', type=click.File('rb'))
+@click.option('--formato', type=click.Choice(['csv', 'ndjson']), default=None,
+              help='Formato do arquivo (padrão: deduzido pela extensão)')
+def importar_pacientes_comando(arquivo, formato):
+    """Importa pacientes de um arquivo CSV ou NDJSON."""
+    if formato is None:
+        formato = 'ndjson' if arquivo.name.endswith(('.ndjson', '.jsonl')) else 'csv'
+
+    linhas = ler_ndjson(arquivo) if formato == 'ndjson' else ler_csv(arquivo)
+    relatorio = importar_pacientes(linhas)
+
+    for erro in relatorio['erros']:
+        click.echo(f"linha {erro['linha']}: {'; '.join(erro['erros'])}", err=True)
+    click.echo(f"{relatorio['importados']} de {relatorio['total']} pacientes importados")
@@ -1,11 +1,54 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from src.models.user import db, User, Mensagem
+from src.models.user import db, User, Mensagem, MensagemArquivo
+from src.services.arquivamento import arquivo_alcancado
+from src.services.limite import limitar
 from datetime import datetime
+from markupsafe import escape
+import re
 
 mensagem_bp = Blueprint('mensagem', __name__)
 
+# Paginação da busca textual
+POR_PAGINA_BUSCA = 20
+MAX_POR_PAGINA_BUSCA = 100
+# A relevância é calculada apenas entre as mensagens mais recentes que casam com a busca,
+# mantendo o custo limitado mesmo para termos muito comuns
+MAX_CANDIDATOS_BUSCA = 500
+
+def filtro_conversa(user, conversa_com=None, modelo=Mensagem):
+    """Filtro das mensagens visíveis para o usuário. Retorna None se a médica não existir."""
+    if user.role == 'paciente':
+        # Paciente vê apenas conversa com a médica
+        medica = User.query.filter_by(role='medica').first()
+        if not medica:
+            return None
+        conversa_com = medica.id
+    
+    if conversa_com:
+        # Conversa específica
+        return (
+            ((modelo.remetente_id == user.id) & (modelo.destinatario_id == conversa_com)) |
+            ((modelo.remetente_id == conversa_com) & (modelo.destinatario_id == user.id))
+        )
+    
+    # Todas as mensagens
+    return (modelo.remetente_id == user.id) | (modelo.destinatario_id == user.id)
+
+def consulta_fts(texto):
+    """Converte o texto digitado em uma consulta FTS5 segura: termos entre aspas, prefixo no último."""
+    termos = re.findall(r'\w+', texto)
+    if not termos:
+        return None
+    consulta = ' '.join(f'"{termo}"' for termo in termos)
+    return consulta + '*'
+
+def destacar_trecho(trecho):
+    # O snippet vem com marcadores de controle; o conteúdo é escapado antes de virar HTML
+    return str(escape(trecho)).replace('\x02', '<mark>').replace('\x03', '</mark>')
+
 @mensagem_bp.route('/mensagens', methods=['POST'])
+@limitar(capacidade=10, por_segundo=0.5)
 @jwt_required()
 def enviar_mensagem():
     try:
@@ -57,6 +100,7 @@ def enviar_mensagem():
         return jsonify({'error': str(e)}), 500
 
 @mensagem_bp.route('/mensagens', methods=['GET'])
+@limitar(capacidade=20, por_segundo=1)
 @jwt_required()
 def listar_mensagens():
     try:
@@ -68,31 +112,32 @@ def listar_mensagens():
         
         # Parâmetros de consulta
         conversa_com = request.args.get('conversa_com', type=int)
+        try:
+            inicio = datetime.fromisoformat(request.args['inicio']) if request.args.get('inicio') else None
+        except ValueError:
+            return jsonify({'error': 'Formato de data inválido. Use YYYY-MM-DD'}), 400
         
-        if user.role == 'paciente':
-            # Paciente vê apenas conversa com a médica
-            medica = User.query.filter_by(role='medica').first()
-            if not medica:
-                return jsonify({'error': 'Médica não encontrada no sistema'}), 404
-            
-            mensagens = Mensagem.query.filter(
-                ((Mensagem.remetente_id == user.id) & (Mensagem.destinatario_id == medica.id)) |
-                ((Mensagem.remetente_id == medica.id) & (Mensagem.destinatario_id == user.id))
-            ).order_by(Mensagem.created_at.asc()).all()
-            
+        filtro = filtro_conversa(user, conversa_com)
+        if filtro is None:
+            return jsonify({'error': 'Médica não encontrada no sistema'}), 404
+        
+        # Conversas em ordem cronológica; a caixa geral da médica, mais recentes primeiro
+        crescente = user.role == 'paciente' or bool(conversa_com)
+        ordem = Mensagem.created_at.asc() if crescente else Mensagem.created_at.desc()
+        
+        consulta = Mensagem.query.filter(filtro)
+        if inicio:
+            consulta = consulta.filter(Mensagem.created_at >= inicio)
+        mensagens = consulta.order_by(ordem).all()
+        
+        # O arquivo só é consultado quando o período pode alcançá-lo
+        if arquivo_alcancado(MensagemArquivo.created_at, inicio):
+            consulta_arquivo = MensagemArquivo.query.filter(filtro_conversa(user, conversa_com, MensagemArquivo))
+            if inicio:
+                consulta_arquivo = consulta_arquivo.filter(MensagemArquivo.created_at >= inicio)
+            arquivadas = consulta_arquivo.all()
         else:
-            # Médica ou admin
-            if conversa_com:
-                # Conversa específica
-                mensagens = Mensagem.query.filter(
-                    ((Mensagem.remetente_id == user.id) & (Mensagem.destinatario_id == conversa_com)) |
-                    ((Mensagem.remetente_id == conversa_com) & (Mensagem.destinatario_id == user.id))
-                ).order_by(Mensagem.created_at.asc()).all()
-            else:
-                # Todas as mensagens
-                mensagens = Mensagem.query.filter(
-                    (Mensagem.remetente_id == user.id) | (Mensagem.destinatario_id == user.id)
-                ).order_by(Mensagem.created_at.desc()).all()
+            arquivadas = []
         
         # Marcar mensagens como lidas
         mensagens_nao_lidas = [m for m in mensagens if m.destinatario_id == user.id and not m.lida]
@@ -102,6 +147,9 @@ def listar_mensagens():
         if mensagens_nao_lidas:
             db.session.commit()
         
+        if arquivadas:
+            mensagens = sorted(arquivadas + mensagens, key=lambda mensagem: mensagem.created_at, reverse=not crescente)
+        
         return jsonify({
             'mensagens': [mensagem.to_dict() for mensagem in mensagens]
         }), 200
@@ -109,7 +157,108 @@ def listar_mensagens():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@mensagem_bp.route('/mensagens/busca', methods=['GET'])
+@limitar(capacidade=10, por_segundo=2)
+@jwt_required()
+def buscar_mensagens():
+    try:
+        user_id = get_jwt_identity()
+        user = User.query.get(user_id)
+        
+        if not user:
+            return jsonify({'error': 'Usuário não encontrado'}), 404
+        
+        consulta = consulta_fts(request.args.get('q', ''))
+        if not consulta:
+            return jsonify({'error': 'Parâmetro q é obrigatório'}), 400
+        
+        pagina = max(request.args.get('pagina', 1, type=int), 1)
+        por_pagina = min(max(request.args.get('por_pagina', POR_PAGINA_BUSCA, type=int), 1), MAX_POR_PAGINA_BUSCA)
+        conversa_com = request.args.get('conversa_com', type=int)
+        
+        # Mesmas regras de visibilidade de listar_mensagens
+        filtro = filtro_conversa(user, conversa_com)
+        if filtro is None:
+            return jsonify({'error': 'Médica não encontrada no sistema'}), 404
+        
+        # O arquivo entra na busca sempre que tiver mensagens: a busca não tem período
+        fontes = [(Mensagem, 'mensagem_fts', filtro)]
+        if arquivo_alcancado(MensagemArquivo.created_at, None):
+            fontes.append((MensagemArquivo, 'mensagem_arquivo_fts', filtro_conversa(user, conversa_com, MensagemArquivo)))
+        
+        # Candidatos: as mensagens visíveis mais recentes que casam, com sua pontuação bm25
+        consultas = []
+        for arquivada, (modelo, nome_fts, filtro_fonte) in enumerate(fontes):
+            fts = db.table(nome_fts, db.column('rowid'))
+            consultas.append(db.select(
+                db.select(
+                    modelo.id,
+                    db.func.bm25(db.literal_column(nome_fts)).label('relevancia'),
+                    db.literal(arquivada).label('arquivada')
+                )
+                .select_from(fts)
+                .join(modelo, modelo.id == fts.c.rowid)
+                .where(db.text(f'{nome_fts} MATCH :consulta').bindparams(consulta=consulta), filtro_fonte)
+                # Ordenar pelo rowid do FTS permite percorrer o índice de trás para frente e parar no limite
+                .order_by(fts.c.rowid.desc())
+                .limit(MAX_CANDIDATOS_BUSCA + 1)
+                .subquery()
+            ))
+        candidatos = (db.union_all(*consultas) if len(consultas) > 1 else consultas[0]).subquery()
+        
+        # Um candidato além do limite indica que há mensagens mais antigas fora da busca
+        truncado = db.session.scalar(
+            db.select(db.func.count()).select_from(candidatos)
+        ) > MAX_CANDIDATOS_BUSCA
+        candidatos = db.select(candidatos).order_by(candidatos.c.id.desc()).limit(MAX_CANDIDATOS_BUSCA).subquery()
+        
+        # Uma linha a mais indica se existe próxima página, sem COUNT sobre todos os resultados
+        pagina_ids = db.session.execute(
+            db.select(candidatos.c.id, candidatos.c.arquivada)
+            .order_by(candidatos.c.relevancia, candidatos.c.id.desc())
+            .limit(por_pagina + 1)
+            .offset((pagina - 1) * por_pagina)
+        ).all()
+        tem_mais = len(pagina_ids) > por_pagina
+        pagina_ids = pagina_ids[:por_pagina]
+        
+        # Trechos destacados e mensagens apenas para a página, em cada fonte
+        trechos = {}
+        por_id = {}
+        for arquivada, (modelo, nome_fts, _) in enumerate(fontes):
+            ids = [linha.id for linha in pagina_ids if linha.arquivada == arquivada]
+            if not ids:
+                continue
+            fts = db.table(nome_fts, db.column('rowid'))
+            trechos.update({
+                (arquivada, rowid): trecho for rowid, trecho in db.session.execute(
+                    db.select(fts.c.rowid, db.func.snippet(db.literal_column(nome_fts), 0, '\x02', '\x03', '…', 16))
+                    .where(db.text(f'{nome_fts} MATCH :consulta').bindparams(consulta=consulta), fts.c.rowid.in_(ids))
+                )
+            })
+            por_id.update({(arquivada, mensagem.id): mensagem for mensagem in modelo.query.filter(modelo.id.in_(ids))})
+        
+        mensagens = []
+        for linha in pagina_ids:
+            chave = (linha.arquivada, linha.id)
+            item = por_id[chave].to_dict()
+            item['trecho'] = destacar_trecho(trechos.get(chave, ''))
+            mensagens.append(item)
+        
+        return jsonify({
+            'mensagens': mensagens,
+            'pagina': pagina,
+            'por_pagina': por_pagina,
+            'tem_mais': tem_mais,
+            # Apenas as MAX_CANDIDATOS_BUSCA mensagens mais recentes foram consideradas
+            'truncado': truncado
+        }), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @mensagem_bp.route('/conversas', methods=['GET'])
+@limitar(capacidade=20, por_segundo=1)
 @jwt_required()
 def listar_conversas():
     try:
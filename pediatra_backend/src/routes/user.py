@@ -1,8 +1,15 @@
 from flask import Blueprint, jsonify, request
+from flask_jwt_extended import jwt_required, get_jwt_identity
 from src.models.user import User, db
+from src.services.limite import limitar
+import re
 
 user_bp = Blueprint('user', __name__)
 
+# Limites da busca de pacientes
+LIMITE_BUSCA_PACIENTES = 10
+MAX_LIMITE_BUSCA_PACIENTES = 50
+
 @user_bp.route('/users', methods=['GET'])
 def get_users():
     users = User.query.all()
@@ -37,3 +44,65 @@ def delete_user(user_id):
     db.session.delete(user)
     db.session.commit()
     return '', 204
+
+@user_bp.route('/pacientes/busca', methods=['GET'])
+@limitar(capacidade=30, por_segundo=10)
+@jwt_required()
+def buscar_pacientes():
+    try:
+        user_id = get_jwt_identity()
+        user = User.query.get(user_id)
+        
+        if not user:
+            return jsonify({'error': 'Usuário não encontrado'}), 404
+        
+        # Apenas médica e admin podem buscar pacientes
+        if user.role not in ['medica', 'admin']:
+            return jsonify({'error': 'Sem permissão para buscar pacientes'}), 403
+        
+        q = request.args.get('q', '').strip()
+        if len(q) < 2:
+            return jsonify({'error': 'Parâmetro q deve ter ao menos 2 caracteres'}), 400
+        
+        limite = min(max(request.args.get('limite', LIMITE_BUSCA_PACIENTES, type=int), 1), MAX_LIMITE_BUSCA_PACIENTES)
+        
+        fts = db.table('paciente_fts', db.column('rowid'))
+        digitos = re.sub(r'\D', '', q)
+        
+        if '@' in q:
+            # E-mail: correspondência exata pelo índice único
+            consulta = User.query.filter(User.role == 'paciente', User.email == q)
+        elif len(digitos) >= 8 and not re.search(r'[^\d\s.\-()/+]', q):
+            # CPF ou telefone: correspondência exata dos dígitos
+            consulta = User.query.join(fts, fts.c.rowid == User.id).filter(
+                db.text('paciente_fts MATCH :consulta').bindparams(consulta=f'documentos : "{digitos}"')
+            )
+        else:
+            # Nome: cada termo como prefixo, sem distinção de acentos
+            termos = re.findall(r'\w+', q)
+            if not termos:
+                return jsonify({'pacientes': []}), 200
+            consulta = User.query.join(fts, fts.c.rowid == User.id).filter(
+                db.text('paciente_fts MATCH :consulta').bindparams(
+                    consulta='nome : (' + ' '.join(f'"{termo}"*' for termo in termos) + ')'
+                )
+            ).order_by(db.func.bm25(db.literal_column('paciente_fts')), User.nome_completo)
+        
+        pacientes = consulta.limit(limite).all()
+        
+        return jsonify({
+            'pacientes': [
+                {
+                    'id': paciente.id,
+                    'nome_completo': paciente.nome_completo,
+                    'cpf': paciente.cpf,
+                    'telefone': paciente.telefone,
+                    'email': paciente.email,
+                    'data_nascimento': paciente.data_nascimento.isoformat() if paciente.data_nascimento else None
+                }
+                for paciente in pacientes
+            ]
+        }), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
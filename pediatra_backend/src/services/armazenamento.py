@@ -0,0 +1,86 @@
+import gzip
+import os
+
+# Bytes lidos/escritos por vez ao gravar ou ler documentos
+TAMANHO_BLOCO = 64 * 1024
+
+# Assinaturas de formatos que já são comprimidos: comprimir de novo só gasta CPU.
+# PNG usa deflate internamente e docx é um ZIP.
+ASSINATURAS_COMPRIMIDAS = [
+    b'%PDF',
+    b'\xff\xd8\xff',         # JPEG
+    b'\x89PNG\r\n\x1a\n',
+    b'PK\x03\x04',           # ZIP (docx, xlsx, ...)
+    b'GIF8',
+    b'\x1f\x8b',             # gzip
+    b'\x28\xb5\x2f\xfd'      # zstd
+]
+
+# Extensão acrescentada ao arquivo gravado, por codec
+EXTENSOES_CODEC = {'gzip': '.gz', 'zstd': '.zst'}
+
+def zstd_disponivel():
+    try:
+        import zstandard  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+def escolher_codec(modo):
+    """Codec a usar no modo configurado: desligado, gzip, zstd ou auto (zstd se instalado, senão gzip)."""
+    if modo in (None, '', 'desligado'):
+        return None
+    if modo == 'zstd' and not zstd_disponivel():
+        raise RuntimeError('A compressão zstd de documentos requer o pacote zstandard')
+    if modo == 'auto':
+        return 'zstd' if zstd_disponivel() else 'gzip'
+    if modo not in EXTENSOES_CODEC:
+        raise ValueError(f'Modo de compressão de documentos inválido: {modo}')
+    return modo
+
+def ja_comprimido(inicio):
+    """Indica, pelos primeiros bytes do arquivo, se o formato já é comprimido."""
+    return any(inicio.startswith(assinatura) for assinatura in ASSINATURAS_COMPRIMIDAS)
+
+def copiar(origem, destino):
+    while True:
+        bloco = origem.read(TAMANHO_BLOCO)
+        if not bloco:
+            break
+        destino.write(bloco)
+
+def salvar_documento(origem, caminho, modo):
+    """Grava o arquivo enviado em `caminho`, comprimindo em blocos quando vale a pena.
+
+    Retorna (caminho gravado, codec ou None, tamanho em disco).
+    """
+    codec = escolher_codec(modo)
+    if codec and ja_comprimido(origem.read(16)):
+        codec = None
+    origem.seek(0)
+
+    if codec:
+        caminho += EXTENSOES_CODEC[codec]
+
+    with open(caminho, 'wb') as destino:
+        if codec == 'zstd':
+            import zstandard
+            with zstandard.ZstdCompressor().stream_writer(destino, closefd=False) as compressor:
+                copiar(origem, compressor)
+        elif codec == 'gzip':
+            with gzip.GzipFile(fileobj=destino, mode='wb', compresslevel=6) as compressor:
+                copiar(origem, compressor)
+        else:
+            copiar(origem, destino)
+
+    return caminho, codec, os.path.getsize(caminho)
+
+def abrir_documento(documento):
+    """Abre o arquivo do documento para leitura já descomprimida."""
+    if documento.codec == 'gzip':
+        return gzip.open(documento.caminho_arquivo, 'rb')
+    arquivo = open(documento.caminho_arquivo, 'rb')
+    if documento.codec == 'zstd':
+        import zstandard
+        return zstandard.ZstdDecompressor().stream_reader(arquivo, closefd=True)
+    return arquivo
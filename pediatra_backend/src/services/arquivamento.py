@@ -0,0 +1,72 @@
+from src.models.user import db, Agendamento, Mensagem, AgendamentoArquivo, MensagemArquivo
+from datetime import datetime, timedelta
+
+# Status finais: apenas estes agendamentos são arquivados
+STATUS_ARQUIVAVEIS = ['realizado', 'cancelado']
+
+def mover_lote(origem, destino, condicao, ordem, tamanho_lote):
+    """Move até `tamanho_lote` linhas de origem para destino em uma transação. Retorna quantas."""
+    ids = db.session.scalars(
+        db.select(origem.c.id).where(condicao).order_by(ordem).limit(tamanho_lote)
+    ).all()
+    if not ids:
+        return 0
+
+    colunas = [coluna.name for coluna in destino.columns]
+    db.session.execute(
+        destino.insert().from_select(
+            colunas,
+            db.select(*[origem.c[nome] for nome in colunas]).where(origem.c.id.in_(ids))
+        )
+    )
+    db.session.execute(origem.delete().where(origem.c.id.in_(ids)))
+    db.session.commit()
+    return len(ids)
+
+def arquivar(idade_dias, tamanho_lote=1000, agora=None):
+    """Move agendamentos finalizados e mensagens mais antigos que `idade_dias` para as tabelas de arquivo.
+
+    Trabalha em lotes curtos para não segurar o banco por muito tempo. Usa SQL direto
+    (sem o ORM) para não marcar os resumos diários como pendentes: os dados só mudam de tabela.
+    """
+    limite = (agora or datetime.now()) - timedelta(days=idade_dias)
+    agendamento = Agendamento.__table__
+    mensagem = Mensagem.__table__
+    total = {'agendamentos': 0, 'mensagens': 0}
+
+    while True:
+        movidos = mover_lote(
+            agendamento,
+            AgendamentoArquivo.__table__,
+            db.and_(agendamento.c.data_hora < limite, agendamento.c.status.in_(STATUS_ARQUIVAVEIS)),
+            agendamento.c.data_hora,
+            tamanho_lote
+        )
+        if not movidos:
+            break
+        total['agendamentos'] += movidos
+
+    while True:
+        movidos = mover_lote(
+            mensagem,
+            MensagemArquivo.__table__,
+            mensagem.c.created_at < limite,
+            mensagem.c.created_at,
+            tamanho_lote
+        )
+        if not movidos:
+            break
+        total['mensagens'] += movidos
+
+    return total
+
+def arquivo_alcancado(coluna, inicio):
+    """Indica se um período que começa em `inicio` (None = sem limite) pode ter linhas no arquivo.
+
+    Usa apenas o máximo da coluna indexada, então a checagem é barata e a tabela de arquivo
+    só entra na consulta quando necessário.
+    """
+    maximo = db.session.scalar(db.select(db.func.max(coluna)))
+    if maximo is None:
+        return False
+    return inicio is None or inicio <= maximo
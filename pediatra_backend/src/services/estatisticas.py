@@ -0,0 +1,177 @@
+from src.models.user import (
+    db, User, Agendamento, Mensagem, AgendamentoArquivo, MensagemArquivo,
+    ResumoAgendamentoDiario, ResumoMensagemDiario, ResumoPendente
+)
+from sqlalchemy import event, inspect
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import aliased
+from datetime import datetime, timedelta
+
+# Alterações de agendamento que mudam os resumos
+CAMPOS_RESUMO_AGENDAMENTO = ['data_hora', 'status', 'tipo_consulta']
+
+def inicio_do_dia(dia):
+    return datetime.combine(dia, datetime.min.time())
+
+def marcar_pendentes(session, tipo, dias):
+    """Registra dias cujos resumos precisam ser recalculados (na transação corrente)."""
+    dias = {dia for dia in dias if dia}
+    if not dias:
+        return
+    # Core direto na conexão: pode ser chamada de dentro de before_flush sem disparar autoflush
+    session.connection().execute(
+        sqlite_insert(ResumoPendente.__table__).on_conflict_do_nothing(),
+        [{'tipo': tipo, 'dia': dia} for dia in dias]
+    )
+
+@event.listens_for(db.session, 'before_flush')
+def registrar_alteracoes(session, flush_context, instances):
+    dias_agendamento = set()
+    dias_mensagem = set()
+
+    for objeto in session.new:
+        if isinstance(objeto, Agendamento) and objeto.data_hora:
+            dias_agendamento.add(objeto.data_hora.date())
+        elif isinstance(objeto, Mensagem):
+            dias_mensagem.add((objeto.created_at or datetime.utcnow()).date())
+
+    for objeto in session.dirty:
+        if not isinstance(objeto, Agendamento):
+            continue
+        estado = inspect(objeto)
+        historicos = [estado.attrs[campo].history for campo in CAMPOS_RESUMO_AGENDAMENTO]
+        if not any(historico.has_changes() for historico in historicos):
+            continue
+        # O dia antigo também muda quando a consulta é remarcada
+        dias_agendamento.add(objeto.data_hora.date())
+        for valor in estado.attrs.data_hora.history.deleted:
+            if valor:
+                dias_agendamento.add(valor.date())
+
+    for objeto in session.deleted:
+        if isinstance(objeto, Agendamento):
+            dias_agendamento.add(objeto.data_hora.date())
+        elif isinstance(objeto, Mensagem):
+            dias_mensagem.add(objeto.created_at.date())
+
+    marcar_pendentes(session, 'agendamento', dias_agendamento)
+    marcar_pendentes(session, 'mensagem', dias_mensagem)
+
+def calcular_agendamentos_dia(dia):
+    # Um dia antigo pode ter parte das consultas já arquivada
+    totais = {}
+    for modelo in [Agendamento, AgendamentoArquivo]:
+        linhas = db.session.execute(
+            db.select(modelo.status, modelo.tipo_consulta, db.func.count())
+            .where(
+                modelo.data_hora >= inicio_do_dia(dia),
+                modelo.data_hora < inicio_do_dia(dia + timedelta(days=1))
+            )
+            .group_by(modelo.status, modelo.tipo_consulta)
+        ).all()
+        for status, tipo_consulta, total in linhas:
+            totais[(status, tipo_consulta)] = totais.get((status, tipo_consulta), 0) + total
+    return [
+        {'dia': dia, 'status': status, 'tipo_consulta': tipo_consulta, 'total': total}
+        for (status, tipo_consulta), total in totais.items()
+    ]
+
+def ultima_mensagem_antes(remetente_id, destinatario_id, antes):
+    """Data da última mensagem de remetente para destinatário antes de `antes`, na tabela
+    corrente ou no arquivo (subconsulta correlacionada)."""
+    maximos = []
+    for modelo in [Mensagem, MensagemArquivo]:
+        anterior = aliased(modelo)
+        maximos.append(
+            db.select(db.func.max(anterior.created_at))
+            .where(
+                anterior.remetente_id == remetente_id,
+                anterior.destinatario_id == destinatario_id,
+                anterior.created_at < antes
+            )
+            .scalar_subquery()
+        )
+    corrente, arquivada = maximos
+    # max() com vários argumentos devolve NULL se algum for NULL
+    return db.func.max(db.func.coalesce(corrente, arquivada), db.func.coalesce(arquivada, corrente))
+
+def calcular_mensagens_dia(dia):
+    """Volume do dia e tempo de resposta da equipe.
+
+    Uma mensagem da médica/admin é resposta quando a última mensagem da conversa foi do
+    paciente; o tempo de resposta é medido desde essa mensagem. Um dia antigo pode ter
+    parte das mensagens já arquivada.
+    """
+    remetente = aliased(User)
+    mensagens = []
+    for modelo in [Mensagem, MensagemArquivo]:
+        mensagens += db.session.execute(
+            db.select(
+                modelo.created_at,
+                remetente.role,
+                ultima_mensagem_antes(modelo.destinatario_id, modelo.remetente_id, modelo.created_at).label('recebida'),
+                ultima_mensagem_antes(modelo.remetente_id, modelo.destinatario_id, modelo.created_at).label('enviada')
+            )
+            .join(remetente, remetente.id == modelo.remetente_id)
+            .where(
+                modelo.created_at >= inicio_do_dia(dia),
+                modelo.created_at < inicio_do_dia(dia + timedelta(days=1))
+            )
+        ).all()
+
+    resumo = {'dia': dia, 'total': 0, 'respostas': 0, 'soma_tempo_resposta': 0.0}
+    for mensagem in mensagens:
+        resumo['total'] += 1
+        if mensagem.role == 'paciente' or not mensagem.recebida:
+            continue
+        if mensagem.enviada and mensagem.enviada > mensagem.recebida:
+            continue
+        resumo['respostas'] += 1
+        resumo['soma_tempo_resposta'] += (mensagem.created_at - mensagem.recebida).total_seconds()
+    return resumo
+
+def atualizar_resumos():
+    """Recalcula os dias pendentes. Retorna quantos dias foram processados."""
+    pendentes = db.session.execute(db.select(ResumoPendente.tipo, ResumoPendente.dia)).all()
+    if not pendentes:
+        return 0
+
+    # Remover os pendentes primeiro: a escrita trava o banco até o commit, então nenhuma
+    # alteração concorrente se perde entre o cálculo e a limpeza
+    db.session.execute(db.delete(ResumoPendente).where(
+        db.tuple_(ResumoPendente.tipo, ResumoPendente.dia).in_([tuple(pendente) for pendente in pendentes])
+    ))
+
+    for tipo, dia in pendentes:
+        if tipo == 'agendamento':
+            db.session.execute(db.delete(ResumoAgendamentoDiario).where(ResumoAgendamentoDiario.dia == dia))
+            linhas = calcular_agendamentos_dia(dia)
+            if linhas:
+                db.session.execute(db.insert(ResumoAgendamentoDiario), linhas)
+        else:
+            db.session.execute(db.delete(ResumoMensagemDiario).where(ResumoMensagemDiario.dia == dia))
+            resumo = calcular_mensagens_dia(dia)
+            if resumo['total']:
+                db.session.execute(db.insert(ResumoMensagemDiario), [resumo])
+
+    db.session.commit()
+    return len(pendentes)
+
+def reconstruir_resumos():
+    """Marca todos os dias com dados como pendentes e recalcula (carga inicial)."""
+    dias_agendamento = db.session.scalars(
+        db.union(
+            db.select(db.func.date(Agendamento.data_hora)),
+            db.select(db.func.date(AgendamentoArquivo.data_hora))
+        )
+    ).all()
+    dias_mensagem = db.session.scalars(
+        db.union(
+            db.select(db.func.date(Mensagem.created_at)),
+            db.select(db.func.date(MensagemArquivo.created_at))
+        )
+    ).all()
+    marcar_pendentes(db.session, 'agendamento', [datetime.strptime(dia, '%Y-%m-%d').date() for dia in dias_agendamento])
+    marcar_pendentes(db.session, 'mensagem', [datetime.strptime(dia, '%Y-%m-%d').date() for dia in dias_mensagem])
+    db.session.commit()
+    return atualizar_resumos()
@@ -0,0 +1,133 @@
+from src.models.user import db, Documento
+import os
+import time
+
+# Situações registradas em Documento.integridade (None = arquivo conferido)
+AUSENTE = 'ausente'
+TAMANHO_DIVERGENTE = 'tamanho_divergente'
+
+def listar_diretorio(caminho):
+    """Arquivos de um diretório: {caminho: os.DirEntry}. None se o diretório não existir."""
+    try:
+        with os.scandir(caminho) as entradas:
+            return {os.path.normpath(entrada.path): entrada for entrada in entradas if entrada.is_file()}
+    except FileNotFoundError:
+        return None
+
+def percorrer_diretorios(pasta, ignorar):
+    """Percorre a árvore com os.scandir, um diretório por vez: gera (diretório, arquivos)."""
+    pendentes = [pasta]
+    while pendentes:
+        atual = pendentes.pop()
+        try:
+            with os.scandir(atual) as entradas:
+                entradas = list(entradas)
+        except FileNotFoundError:
+            continue
+        for entrada in entradas:
+            if entrada.is_dir(follow_symlinks=False) and os.path.normpath(entrada.path) != ignorar:
+                pendentes.append(entrada.path)
+        yield atual, [entrada for entrada in entradas if entrada.is_file(follow_symlinks=False)]
+
+def conferir_documentos(tamanho_lote=1000):
+    """Confere cada Documento com o arquivo em disco, em lotes ordenados por id.
+
+    Cada diretório é listado uma vez por lote; divergências são gravadas em Documento.integridade.
+    """
+    total = {'verificados': 0, AUSENTE: 0, TAMANHO_DIVERGENTE: 0, 'sem_diretorio': 0}
+    ultimo_id = 0
+
+    while True:
+        documentos = db.session.execute(
+            db.select(
+                Documento.id, Documento.caminho_arquivo, Documento.tamanho_arquivo,
+                Documento.tamanho_armazenado, Documento.integridade
+            )
+            .where(Documento.id > ultimo_id)
+            .order_by(Documento.id)
+            .limit(tamanho_lote)
+        ).all()
+        if not documentos:
+            break
+        ultimo_id = documentos[-1].id
+
+        diretorios = {}
+        alteracoes = []
+        for documento in documentos:
+            caminho = os.path.normpath(documento.caminho_arquivo)
+            diretorio = os.path.dirname(caminho)
+            if diretorio not in diretorios:
+                diretorios[diretorio] = listar_diretorio(diretorio)
+
+            arquivos = diretorios[diretorio]
+            if arquivos is None:
+                # Diretório inteiro ausente indica pasta errada ou volume não montado, não
+                # arquivos perdidos: a situação registrada não muda
+                total['sem_diretorio'] += 1
+                continue
+
+            entrada = arquivos.get(caminho)
+            # Documentos anteriores à compressão não têm tamanho_armazenado
+            esperado = documento.tamanho_armazenado if documento.tamanho_armazenado is not None else documento.tamanho_arquivo
+            if entrada is None:
+                situacao = AUSENTE
+            elif entrada.stat().st_size != esperado:
+                situacao = TAMANHO_DIVERGENTE
+            else:
+                situacao = None
+
+            total['verificados'] += 1
+            if situacao:
+                total[situacao] += 1
+            if situacao != documento.integridade:
+                alteracoes.append({'id': documento.id, 'integridade': situacao})
+
+        if alteracoes:
+            db.session.execute(db.update(Documento), alteracoes)
+        db.session.commit()
+
+    return total
+
+def mover_para_quarentena(caminho, pasta, quarentena):
+    destino = os.path.join(quarentena, os.path.relpath(caminho, pasta))
+    os.makedirs(os.path.dirname(destino), exist_ok=True)
+    os.replace(caminho, destino)
+
+def isolar_orfaos(pasta, quarentena, carencia_segundos=3600, tamanho_lote=500):
+    """Move para a quarentena arquivos de `pasta` sem Documento correspondente.
+
+    Arquivos modificados há menos de `carencia_segundos` são mantidos: o upload grava o
+    arquivo antes de criar o registro.
+    """
+    limite = time.time() - carencia_segundos
+    quarentena = os.path.normpath(quarentena)
+    orfaos = 0
+
+    for diretorio, arquivos in percorrer_diretorios(pasta, quarentena):
+        caminhos = [
+            os.path.normpath(entrada.path) for entrada in arquivos
+            if entrada.stat(follow_symlinks=False).st_mtime < limite
+        ]
+        for i in range(0, len(caminhos), tamanho_lote):
+            lote = caminhos[i:i + tamanho_lote]
+            registrados = set(db.session.scalars(
+                db.select(Documento.caminho_arquivo).where(Documento.caminho_arquivo.in_(lote))
+            ))
+            for caminho in lote:
+                if caminho not in registrados:
+                    mover_para_quarentena(caminho, pasta, quarentena)
+                    orfaos += 1
+
+    return orfaos
+
+def verificar_uploads(pasta, quarentena, carencia_segundos=3600, tamanho_lote=1000):
+    """Reconcilia a pasta de uploads com a tabela Documento.
+
+    Os caminhos são relativos ao diretório de trabalho: sem a pasta de uploads nada é
+    verificado, para não marcar todos os documentos como ausentes.
+    """
+    if not os.path.isdir(pasta):
+        raise FileNotFoundError(f'Pasta de uploads não encontrada: {os.path.abspath(pasta)}')
+    total = conferir_documentos(tamanho_lote=tamanho_lote)
+    total['orfaos'] = isolar_orfaos(pasta, quarentena, carencia_segundos=carencia_segundos)
+    return total
@@ -0,0 +1,218 @@
+from src.models.user import db, User, Agendamento
+from abc import ABC, abstractmethod
+from email.message import EmailMessage
+from datetime import datetime, timedelta
+import json
+import smtplib
+import threading
+import urllib.request
+
+# Status que recebem lembrete
+STATUS_LEMBRETE = ['agendado', 'confirmado']
+
+class EnvioParcial(Exception):
+    """Falha no meio de um lote: `enviados` traz os agendamento_id já entregues ao canal."""
+
+    def __init__(self, enviados, causa):
+        super().__init__(f'{len(enviados)} lembrete(s) enviados antes da falha: {causa}')
+        self.enviados = enviados
+
+class Notificador(ABC):
+    """Interface dos canais de envio. `enviar` recebe uma lista de dicionários de lembrete."""
+
+    @abstractmethod
+    def enviar(self, lembretes):
+        pass
+
+class LogNotificador(Notificador):
+    def enviar(self, lembretes):
+        for lembrete in lembretes:
+            print(f"Lembrete: {lembrete['paciente_nome']} em {lembrete['data_hora']} ({lembrete['tipo_consulta']})")
+
+class SMTPNotificador(Notificador):
+    def __init__(self, host, porta, remetente, usuario=None, senha=None, tls=False, timeout=10):
+        self.host = host
+        self.porta = porta
+        self.remetente = remetente
+        self.usuario = usuario
+        self.senha = senha
+        self.tls = tls
+        self.timeout = timeout
+
+    def enviar(self, lembretes):
+        # Uma conexão por lote; e-mails já entregues não podem voltar para a fila
+        enviados = []
+        try:
+            with smtplib.SMTP(self.host, self.porta, timeout=self.timeout) as smtp:
+                if self.tls:
+                    smtp.starttls()
+                if self.usuario:
+                    smtp.login(self.usuario, self.senha)
+                for lembrete in lembretes:
+                    mensagem = EmailMessage()
+                    mensagem['From'] = self.remetente
+                    mensagem['To'] = lembrete['paciente_email']
+                    mensagem['Subject'] = 'Lembrete de consulta'
+                    data_hora = datetime.fromisoformat(lembrete['data_hora'])
+                    mensagem.set_content(
+                        f"Olá, {lembrete['paciente_nome']}.\n\n"
+                        f"Lembramos que sua consulta está marcada para {data_hora.strftime('%d/%m/%Y às %H:%M')}.\n"
+                    )
+                    smtp.send_message(mensagem)
+                    enviados.append(lembrete['agendamento_id'])
+        except Exception as e:
+            if enviados:
+                raise EnvioParcial(enviados, e) from e
+            raise
+
+class WebhookNotificador(Notificador):
+    def __init__(self, url, timeout=10):
+        self.url = url
+        self.timeout = timeout
+
+    def enviar(self, lembretes):
+        # Um POST por lote; qualquer status diferente de 2xx levanta HTTPError
+        corpo = json.dumps({'lembretes': lembretes}).encode('utf-8')
+        requisicao = urllib.request.Request(
+            self.url,
+            data=corpo,
+            headers={'Content-Type': 'application/json'},
+            method='POST'
+        )
+        with urllib.request.urlopen(requisicao, timeout=self.timeout):
+            pass
+
+def criar_notificador(config):
+    tipo = config.get('LEMBRETES_NOTIFICADOR', 'log')
+    if tipo == 'smtp':
+        return SMTPNotificador(
+            config['SMTP_HOST'],
+            int(config.get('SMTP_PORTA', 25)),
+            config['SMTP_REMETENTE'],
+            usuario=config.get('SMTP_USUARIO'),
+            senha=config.get('SMTP_SENHA'),
+            tls=bool(config.get('SMTP_TLS'))
+        )
+    if tipo == 'webhook':
+        return WebhookNotificador(config['LEMBRETES_WEBHOOK_URL'])
+    if tipo == 'log':
+        return LogNotificador()
+    raise ValueError(f'Notificador de lembretes desconhecido: {tipo}')
+
+def processar_lembretes(notificador, antecedencia=timedelta(hours=24), tamanho_lote=100, agora=None):
+    """Envia os lembretes das consultas que começam dentro da janela de antecedência.
+
+    Cada lote é reservado em `lembrete_enviado_em` antes do envio, e apenas as linhas
+    reservadas por esta chamada são enviadas: dois agendadores nunca mandam o mesmo
+    lembrete. Uma falha no envio libera para o próximo ciclo as linhas do lote que não
+    foram enviadas (EnvioParcial informa as que foram). Retorna o número de lembretes
+    enviados.
+    """
+    agora = agora or datetime.now()
+    total = 0
+
+    while True:
+        # Faixa no índice (lembrete_enviado_em, data_hora)
+        ids = db.session.scalars(
+            db.select(Agendamento.id)
+            .where(
+                Agendamento.lembrete_enviado_em.is_(None),
+                Agendamento.data_hora > agora,
+                Agendamento.data_hora <= agora + antecedencia,
+                Agendamento.status.in_(STATUS_LEMBRETE)
+            )
+            .order_by(Agendamento.data_hora, Agendamento.id)
+            .limit(tamanho_lote)
+        ).all()
+
+        if not ids:
+            return total
+
+        # Reserva: só fica com as linhas que ainda estavam livres no momento do UPDATE
+        reservado_em = datetime.utcnow()
+        reservados = db.session.scalars(
+            db.update(Agendamento)
+            .where(Agendamento.id.in_(ids), Agendamento.lembrete_enviado_em.is_(None))
+            .values(lembrete_enviado_em=reservado_em)
+            .returning(Agendamento.id)
+        ).all()
+        db.session.commit()
+
+        if not reservados:
+            continue
+
+        pendentes = db.session.execute(
+            db.select(
+                Agendamento.id,
+                Agendamento.data_hora,
+                Agendamento.tipo_consulta,
+                User.nome_completo,
+                User.email
+            )
+            .join(User, User.id == Agendamento.paciente_id)
+            .where(Agendamento.id.in_(reservados))
+            .order_by(Agendamento.data_hora, Agendamento.id)
+        ).all()
+
+        try:
+            notificador.enviar([
+                {
+                    'agendamento_id': pendente.id,
+                    'data_hora': pendente.data_hora.isoformat(),
+                    'tipo_consulta': pendente.tipo_consulta,
+                    'paciente_nome': pendente.nome_completo,
+                    'paciente_email': pendente.email
+                }
+                for pendente in pendentes
+            ])
+        except Exception as e:
+            enviados = set(e.enviados) if isinstance(e, EnvioParcial) else set()
+            liberar = [agendamento_id for agendamento_id in reservados if agendamento_id not in enviados]
+            db.session.rollback()
+            db.session.execute(
+                db.update(Agendamento)
+                .where(Agendamento.id.in_(liberar), Agendamento.lembrete_enviado_em == reservado_em)
+                .values(lembrete_enviado_em=None)
+            )
+            db.session.commit()
+            raise
+
+        total += len(pendentes)
+
+class AgendadorLembretes:
+    """Executa `processar_lembretes` periodicamente em uma thread própria.
+
+    Deve haver um único agendador ativo: com vários workers web, use o comando
+    `flask lembretes` em um processo separado em vez da thread embutida.
+    """
+
+    def __init__(self, app, notificador, intervalo=60, antecedencia=timedelta(hours=24)):
+        self.app = app
+        self.notificador = notificador
+        self.intervalo = intervalo
+        self.antecedencia = antecedencia
+        self._parar = threading.Event()
+        self._thread = None
+
+    def executar_ciclo(self):
+        with self.app.app_context():
+            try:
+                return processar_lembretes(self.notificador, self.antecedencia)
+            except Exception as e:
+                db.session.rollback()
+                print(f"Erro ao enviar lembretes: {e}")
+                return 0
+
+    def executar(self):
+        while not self._parar.is_set():
+            self.executar_ciclo()
+            self._parar.wait(self.intervalo)
+
+    def iniciar(self):
+        self._thread = threading.Thread(target=self.executar, name='agendador-lembretes', daemon=True)
+        self._thread.start()
+
+    def parar(self):
+        self._parar.set()
+        if self._thread:
+            self._thread.join()
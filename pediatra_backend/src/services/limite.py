@@ -0,0 +1,132 @@
+from flask import request, jsonify
+from flask_jwt_extended import verify_jwt_in_request, get_jwt_identity
+from functools import wraps
+import math
+import threading
+import time
+
+class BaldeMemoria:
+    """Token bucket em memória, por processo. Cada verificação é O(1)."""
+
+    # A cada N verificações, remove chaves ociosas cujo balde já estaria cheio
+    INTERVALO_LIMPEZA = 10000
+
+    def __init__(self):
+        self.baldes = {}
+        self.lock = threading.Lock()
+        self.verificacoes = 0
+
+    def consumir(self, chave, capacidade, por_segundo):
+        """Retorna (permitido, segundos até haver um token)."""
+        agora = time.monotonic()
+        with self.lock:
+            tokens, ultimo = self.baldes.get(chave, (capacidade, agora))
+            tokens = min(capacidade, tokens + (agora - ultimo) * por_segundo)
+            if tokens >= 1:
+                self.baldes[chave] = (tokens - 1, agora)
+                permitido, espera = True, 0
+            else:
+                self.baldes[chave] = (tokens, agora)
+                permitido, espera = False, (1 - tokens) / por_segundo
+
+            self.verificacoes += 1
+            if self.verificacoes % self.INTERVALO_LIMPEZA == 0:
+                self.limpar(agora)
+        return permitido, espera
+
+    def limpar(self, agora):
+        # Uma hora sem uso: qualquer balde com recarga razoável já está cheio
+        self.baldes = {chave: balde for chave, balde in self.baldes.items() if agora - balde[1] < 3600}
+
+# Mesmo algoritmo do BaldeMemoria, executado atomicamente no Redis
+SCRIPT_BALDE_REDIS = """
+local capacidade = tonumber(ARGV[1])
+local por_segundo = tonumber(ARGV[2])
+local agora = tonumber(ARGV[3])
+local balde = redis.call('HMGET', KEYS[1], 'tokens', 'ultimo')
+local tokens = tonumber(balde[1]) or capacidade
+local ultimo = tonumber(balde[2]) or agora
+tokens = math.min(capacidade, tokens + math.max(0, agora - ultimo) * por_segundo)
+local permitido = 0
+local espera = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    permitido = 1
+else
+    espera = (1 - tokens) / por_segundo
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ultimo', tostring(agora))
+redis.call('EXPIRE', KEYS[1], math.ceil(capacidade / por_segundo) + 1)
+return {permitido, tostring(espera)}
+"""
+
+class BaldeRedis:
+    """Token bucket compartilhado entre workers via Redis (dependência opcional `redis`)."""
+
+    def __init__(self, url=None, cliente=None, prefixo='limite:'):
+        if cliente is None:
+            try:
+                import redis
+            except ImportError:
+                raise RuntimeError('O backend redis de limite de requisições requer o pacote redis')
+            cliente = redis.Redis.from_url(url)
+        self.cliente = cliente
+        self.prefixo = prefixo
+        self.script = cliente.register_script(SCRIPT_BALDE_REDIS)
+
+    def consumir(self, chave, capacidade, por_segundo):
+        permitido, espera = self.script(
+            keys=[self.prefixo + chave],
+            args=[capacidade, por_segundo, time.time()]
+        )
+        return bool(int(permitido)), float(espera)
+
+class Limitador:
+    def __init__(self, backend=None):
+        self.backend = backend or BaldeMemoria()
+        self.contadores = {}
+        self.lock = threading.Lock()
+
+    def configurar(self, backend):
+        self.backend = backend
+
+    def contar(self, endpoint, resultado):
+        with self.lock:
+            contador = self.contadores.setdefault(endpoint, {'permitidas': 0, 'bloqueadas': 0})
+            contador[resultado] += 1
+
+    def metricas(self):
+        with self.lock:
+            return {endpoint: dict(contador) for endpoint, contador in self.contadores.items()}
+
+limitador = Limitador()
+
+def identificar_cliente():
+    """Identidade do JWT, se houver um token válido; senão o IP."""
+    try:
+        verify_jwt_in_request(optional=True)
+        identidade = get_jwt_identity()
+    except Exception:
+        identidade = None
+    if identidade is not None:
+        return f'usuario:{identidade}'
+    return f'ip:{request.remote_addr}'
+
+def limitar(capacidade, por_segundo):
+    """Limita o endpoint a rajadas de `capacidade` requisições, recarregando `por_segundo` por cliente."""
+    def decorador(funcao):
+        @wraps(funcao)
+        def envolvida(*args, **kwargs):
+            endpoint = request.endpoint
+            permitido, espera = limitador.backend.consumir(
+                f'{endpoint}:{identificar_cliente()}', capacidade, por_segundo
+            )
+            if not permitido:
+                limitador.contar(endpoint, 'bloqueadas')
+                resposta = jsonify({'error': 'Muitas requisições. Tente novamente em instantes'})
+                resposta.headers['Retry-After'] = str(max(1, math.ceil(espera)))
+                return resposta, 429
+            limitador.contar(endpoint, 'permitidas')
+            return funcao(*args, **kwargs)
+        return envolvida
+    return decorador